@@ -0,0 +1,191 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Optional
+import numpy as np
+from generators.colors import rgb_array_to_hex
+from generators.hsl_color_generator import (
+    DEFAULT_STRATEGY,
+    BatchStats,
+    ColorGenerator,
+    playable_strategies,
+)
+from generators.palette_cache import PaletteCache, default_cache_path
+
+# Generate palettes in bulk across processes, e.g. to pre-build puzzle pools:
+#   python -m generators.batch --sizes 5 10 --count 1000000 --output palettes
+# Each shard is one file: a (boards, size, size, 3) uint8 RGB .npy array, or a .txt hex table
+# in the save_colors_hex layout with a blank line between boards. With --cache PATH every board
+# also goes into that palette cache under its own seed, ready for the game to pick up
+FORMATS = ("npy", "hex")
+
+
+@dataclass
+class ShardResult:
+    size: int
+    boards: int
+    out_of_bounds: int
+    seconds: float
+    # Boards kept without passing the distinctness check
+    indistinct: int = 0
+
+
+def shard_path(output: str, size: int, shard: int, file_format: str) -> str:
+    extension = "npy" if file_format == "npy" else "txt"
+    return os.path.join(output, f"size-{size:02d}", f"shard-{shard:05d}.{extension}")
+
+
+def write_shard(path: str, boards: np.ndarray, file_format: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if file_format == "npy":
+        np.save(path, boards)
+        return
+    with open(path, "w") as file:
+        for board in rgb_array_to_hex(boards):
+            file.write('\n'.join(['\t'.join(row) for row in board]))
+            file.write("\n\n")
+
+
+def shard_seed(seed: Optional[int], size: int, shard: int) -> Optional[int]:
+    # Independent, reproducible streams per (size, shard) from one run seed
+    if seed is None:
+        return None
+    state = np.random.SeedSequence([seed, size, shard]).generate_state(1, np.uint64)
+    return int(state[0] >> 1)
+
+
+def generate_seeded_boards(
+    size: int,
+    count: int,
+    seed: Optional[int],
+    strategy: str = DEFAULT_STRATEGY,
+    stats: Optional[BatchStats] = None,
+) -> tuple[list[int], np.ndarray]:
+    # One seed per board, so Board(size, seed=...) regenerates exactly the cached palette.
+    # Every board's generator statistics are added to stats
+    stats = stats or BatchStats()
+    seeds = np.random.default_rng(seed).integers(0, 1 << 63, count).tolist()
+    boards = []
+    for board_seed in seeds:
+        generator = ColorGenerator(size, board_seed, strategy)
+        boards.append(generator.generate_board_rgb(size))
+        stats.boards += generator.board_stats.boards
+        stats.out_of_bounds += generator.board_stats.out_of_bounds
+        stats.redrawn += generator.board_stats.redrawn
+        stats.indistinct += generator.board_stats.indistinct
+    return seeds, np.stack(boards)
+
+
+def generate_shard(
+    size: int,
+    shard: int,
+    count: int,
+    output: str,
+    file_format: str,
+    seed: Optional[int] = None,
+    cache_path: Optional[str] = None,
+    strategy: str = DEFAULT_STRATEGY,
+) -> ShardResult:
+    start = time.perf_counter()
+    generator = ColorGenerator(size, shard_seed(seed, size, shard), strategy)
+    if cache_path is None:
+        boards = generator.generate_boards(size, count)
+        stats = generator.last_batch_stats
+    else:
+        stats = BatchStats()
+        seeds, boards = generate_seeded_boards(size, count, generator.seed, strategy, stats)
+        cache = PaletteCache(cache_path)
+        cache.put_many(size, strategy, zip(seeds, boards))
+        cache.close()
+    write_shard(shard_path(output, size, shard, file_format), boards, file_format)
+    return ShardResult(
+        size, count, stats.out_of_bounds, time.perf_counter() - start, stats.indistinct
+    )
+
+
+def run(
+    sizes: list[int],
+    count: int,
+    output: str,
+    shard_size: int,
+    workers: int,
+    file_format: str,
+    seed: Optional[int] = None,
+    cache_path: Optional[str] = None,
+    strategy: str = DEFAULT_STRATEGY,
+) -> dict[int, list[ShardResult]]:
+    results: dict[int, list[ShardResult]] = {size: [] for size in sizes}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for size in sizes:
+            for shard, start in enumerate(range(0, count, shard_size)):
+                shard_count = min(shard_size, count - start)
+                futures.append(pool.submit(
+                    generate_shard,
+                    size,
+                    shard,
+                    shard_count,
+                    output,
+                    file_format,
+                    seed,
+                    cache_path,
+                    strategy,
+                ))
+        for future in as_completed(futures):
+            result = future.result()
+            results[result.size].append(result)
+    return results
+
+
+def report(results: dict[int, list[ShardResult]], wall_seconds: float, workers: int):
+    for size, shards in results.items():
+        boards = sum(shard.boards for shard in shards)
+        out_of_bounds = sum(shard.out_of_bounds for shard in shards)
+        indistinct = sum(shard.indistinct for shard in shards)
+        # Worker time is spread over the pool, so scale it to an estimate of wall time; a size
+        # with fewer shards than workers only ever kept that many of them busy
+        seconds = sum(shard.seconds for shard in shards) / min(workers, len(shards) or 1)
+        rejection_rate = out_of_bounds / (boards + out_of_bounds) if boards else 0.0
+        print(
+            f"Size {size}: {boards} boards in {len(shards)} shards, "
+            f"{boards / seconds if seconds else 0:.0f} boards/s, "
+            f"{out_of_bounds} out of bounds ({rejection_rate:.2%} rejected), "
+            f"{indistinct} below the distinctness threshold"
+        )
+    total = sum(shard.boards for shards in results.values() for shard in shards)
+    print(f"Total: {total} boards in {wall_seconds:.1f} s ({total / wall_seconds:.0f} boards/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate color palettes in bulk, headless")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[5], help="board widths")
+    parser.add_argument("--count", type=int, default=10000, help="palettes per size")
+    parser.add_argument("--output", default="palettes", help="directory for the shard files")
+    parser.add_argument("--shard-size", type=int, default=10000, help="palettes per shard file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--format", choices=FORMATS, default="npy", dest="file_format")
+    parser.add_argument("--seed", type=int, help="make the whole run reproducible")
+    parser.add_argument(
+        "--strategy", choices=sorted(playable_strategies()), default=DEFAULT_STRATEGY
+    )
+    parser.add_argument(
+        "--cache", nargs="?", const=default_cache_path(), help="also fill this palette cache"
+    )
+    args = parser.parse_args()
+    for size in args.sizes:
+        assert size > 2, "The width of the board must be greater than 2 colors!"
+    start = time.perf_counter()
+    results = run(
+        args.sizes,
+        args.count,
+        args.output,
+        args.shard_size,
+        args.workers,
+        args.file_format,
+        args.seed,
+        args.cache,
+        args.strategy,
+    )
+    report(results, time.perf_counter() - start, args.workers)
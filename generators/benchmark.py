@@ -0,0 +1,149 @@
+import argparse
+import statistics
+import time
+from random import randint
+from typing import Callable, Iterable
+from generators.colors import HSL
+from generators.hsl_color_generator import CORNER_STRATEGIES, BatchStats, ColorGenerator
+from generators.vector_math import points_on_a_circle
+
+
+# The original rejection-loop samplers, kept to measure the analytic versions against.
+# Both return the corners and the number of centres drawn before one was accepted
+
+
+def rejection_smaller_range(generator: ColorGenerator) -> tuple[list[list[HSL]], int]:
+    iterations = 1
+    centre = generator.random_color()
+    pin = centre.s
+    max_radius = centre.min_distance_to_bounds()
+    min_radius = 30
+    while min_radius + 2 >= max_radius - 2 or pin <= 20:
+        iterations += 1
+        centre = generator.random_color()
+        pin = centre.s
+        max_radius = centre.min_distance_to_bounds()
+    radius = randint(min_radius + 1, max_radius - 1)
+    points = [HSL(h, pin, l) for h, l in points_on_a_circle((centre.h, centre.l), radius)]
+    return [points[:2], points[2:]], iterations
+
+
+def rejection_across_colors(generator: ColorGenerator) -> tuple[list[list[HSL]], int]:
+    iterations = 1
+    centre = (randint(0, 100), randint(0, 100))
+    pin = randint(5, 90)
+    max_radius = min(centre[0], centre[1], 100 - centre[0], 100 - centre[1], pin, 100 - pin)
+    min_radius = 10
+    while min_radius + 2 >= max_radius - 2:
+        iterations += 1
+        centre = (randint(0, 100), randint(0, 100))
+        pin = randint(5, 90)
+        max_radius = min(centre[0], centre[1], 100 - centre[0], 100 - centre[1], pin, 100 - pin)
+    radius = randint(min_radius + 1, max_radius - 1)
+    points = points_on_a_circle((centre[0], centre[1]), radius)
+    points = [HSL(round(h * 3.6), pin, l) for h, l in points]
+    return [points[:2], points[2:]], iterations
+
+
+def percentile(values: list[float], pct: int) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[pct - 1]
+
+
+def time_calls(function: Callable, samples: int) -> tuple[list[float], list]:
+    timings, results = [], []
+    for _ in range(samples):
+        start = time.perf_counter()
+        results.append(function())
+        timings.append((time.perf_counter() - start) * 1e6)
+    return timings, results
+
+
+def mean_centre(corners: list[list[list[HSL]]]) -> tuple[float, float, float]:
+    # Average of the four corners' centre, a cheap check that both samplers agree
+    points = [point for corner in corners for row in corner for point in row]
+    return (
+        statistics.fmean(point.h for point in points),
+        statistics.fmean(point.s for point in points),
+        statistics.fmean(point.l for point in points),
+    )
+
+
+def benchmark_corner_sampling(samples: int):
+    generator = ColorGenerator(5)
+    samplers = [
+        ("smaller_range", rejection_smaller_range,
+         generator.generate_points_from_circle_smaller_range),
+        ("across_colors", rejection_across_colors,
+         generator.generate_points_from_circle_across_colors),
+    ]
+    for name, rejection, analytic in samplers:
+        rejection_us, rejection_results = time_calls(lambda: rejection(generator), samples)
+        analytic_us, analytic_corners = time_calls(analytic, samples)
+        iterations = [count for _, count in rejection_results]
+        print(f"{name}:")
+        print(
+            f"  rejection loop: {statistics.fmean(iterations):.2f} draws on average, "
+            f"p99 {percentile(iterations, 99):.0f}, max {max(iterations)}; "
+            f"{statistics.fmean(rejection_us):.1f} us mean, "
+            f"p99 {percentile(rejection_us, 99):.1f} us"
+        )
+        print(
+            f"  analytic:       1 draw always; "
+            f"{statistics.fmean(analytic_us):.1f} us mean, p99 {percentile(analytic_us, 99):.1f} us"
+        )
+        rejection_mean = mean_centre([corners for corners, _ in rejection_results])
+        analytic_mean = mean_centre(analytic_corners)
+        print(f"  mean corner HSL: rejection {tuple(round(x, 1) for x in rejection_mean)}, "
+              f"analytic {tuple(round(x, 1) for x in analytic_mean)}")
+
+
+def rate(part: int, whole: int) -> float:
+    return part / whole if whole else 0.0
+
+
+def benchmark_strategies(
+    strategies: Iterable[str], sizes: Iterable[int], samples: int, batch_boards: int
+):
+    # Per strategy and board size:
+    #   one board    latency of generate_board_array (corners, gradient, distinctness check)
+    #   rejected     drawn boards thrown away by the distinctness check
+    #   indistinct   boards kept as the best attempt without passing it
+    #   batch        generate_boards throughput and corner sets that left the HSL space
+    print(f"{'strategy':<17} {'size':>4}  {'mean us':>8} {'p50':>8} {'p99':>8} {'max':>8}  "
+          f"{'rejected':>8} {'indist.':>8}  {'batch us':>8} {'out of bounds':>13}")
+    for strategy in strategies:
+        for size in sizes:
+            generator = ColorGenerator(size, strategy=strategy)
+            timings, _ = time_calls(lambda: generator.generate_board_array(size), samples)
+            stats = generator.board_stats
+            start = time.perf_counter()
+            generator.generate_boards(size, batch_boards)
+            batch_us = (time.perf_counter() - start) * 1e6 / batch_boards
+            batch: BatchStats = generator.last_batch_stats
+            corner_sets = batch.boards + batch.redrawn + batch.out_of_bounds
+            print(
+                f"{strategy:<17} {size:>4}  {statistics.fmean(timings):>8.1f} "
+                f"{percentile(timings, 50):>8.1f} {percentile(timings, 99):>8.1f} "
+                f"{max(timings):>8.1f}  "
+                f"{rate(stats.redrawn, stats.boards + stats.redrawn):>8.1%} "
+                f"{rate(stats.indistinct, stats.boards):>8.1%}  {batch_us:>8.1f} "
+                f"{rate(batch.out_of_bounds, corner_sets):>13.2%}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the board generators")
+    parser.add_argument("--samples", type=int, default=20000, help="calls per measurement")
+    parser.add_argument(
+        "--strategies",
+        nargs="+",
+        choices=sorted(CORNER_STRATEGIES),
+        default=list(CORNER_STRATEGIES),
+    )
+    parser.add_argument("--sizes", nargs="+", type=int, default=[5, 10, 20], help="board widths")
+    parser.add_argument("--board-samples", type=int, default=1000, help="boards per strategy/size")
+    parser.add_argument("--batch", type=int, default=10000, help="boards per batch measurement")
+    args = parser.parse_args()
+    benchmark_corner_sampling(args.samples)
+    print()
+    benchmark_strategies(args.strategies, args.sizes, args.board_samples, args.batch)
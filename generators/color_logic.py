@@ -1,9 +1,17 @@
+from array import array
+from bisect import bisect_left
 from dataclasses import dataclass
 from typing import Optional, TYPE_CHECKING
 if TYPE_CHECKING:
     from main import QBoard
-from random import randint, sample
-from generators.hsl_color_generator import ColorGenerator
+    from generators.savegame import GameJournal
+from random import Random
+import random
+import numpy as np
+from generators.colors import pack_rgb_array, unpack_rgb_array
+from generators.hsl_color_generator import DEFAULT_STRATEGY, ColorGenerator
+from generators.palette_cache import PaletteCache
+from generators.solver import min_swaps, optimal_swaps
 
 
 @dataclass
@@ -12,7 +20,8 @@ class Coordinates:
     col: int
 
     @classmethod
-    def random(cls, size: int) -> "Coordinates":
+    def random(cls, size: int, rng: Optional[Random] = None) -> "Coordinates":
+        randint = (rng or random).randint
         from_coords = Coordinates(randint(0, size - 1), randint(0, size - 1))
         while PinnedPoints(size).has(from_coords):
             from_coords = Coordinates(randint(0, size - 1), randint(0, size - 1))
@@ -40,6 +49,13 @@ class PinnedPoints:
         bottom_right = board.get_solution_cell(self.BOTTOMRIGHT)
         return top_left, top_right, bottom_left, bottom_right
 
+    def flat_indices(self) -> set[int]:
+        # Positions of the pinned points in a row-major flattened board
+        return {
+            coords.row * self.board_size + coords.col
+            for coords in (self.TOPLEFT, self.TOPRIGHT, self.BOTTOMLEFT, self.BOTTOMRIGHT)
+        }
+
     def has(self, coords: Coordinates) -> bool:
         equals = coords == self.TOPLEFT or \
             coords == self.TOPRIGHT or \
@@ -49,60 +65,194 @@ class PinnedPoints:
 
 
 class Board:
-    def __init__(self, size: int):
+    def __init__(
+        self,
+        size: int,
+        debug: bool = False,
+        solution: Optional[list[list[str]]] = None,
+        seed: Optional[int] = None,
+        cache: Optional[PaletteCache] = None,
+        shuffle: bool = True,
+        strategy: str = DEFAULT_STRATEGY,
+    ):
         assert size > 2, "The width of the board must be greater than 2 colors!"
         self.size = size
-        self.generator = ColorGenerator(size)
-        self.solution = self.generator.generate_initial_color_board(self.size)
-        self.board = self.shuffle_board_from_solution()
-
-    def shuffle_board_from_solution(self) -> list[list[str]]:
-        corner_points = PinnedPoints(self.size).get_fields_from_points(self)
-        colors = self.flatten_board(self.solution)
-        # The analog of a 'shuffle' - sample N random colors from a list where N is just all of them
-        shuffled_colors = sample(colors, len(colors))
-        # Remove corner points from the shuffled list to set them explicitly
-        for point in corner_points:
-            shuffled_colors.pop(shuffled_colors.index(point))
-        color_board = []
-        for row in range(self.size):
-            new_row = []
-            for col in range(self.size):
-                if row == 0 and col == 0:
-                    new_row.append(corner_points[0])
-                elif row == 0 and col == self.size - 1:
-                    new_row.append(corner_points[1])
-                elif row == self.size - 1 and col == 0:
-                    new_row.append(corner_points[2])
-                elif row == self.size - 1 and col == self.size - 1:
-                    new_row.append(corner_points[3])
-                else:
-                    new_row.append(shuffled_colors.pop())
-            color_board.append(new_row)
-        print(color_board)
-        return color_board
+        # Print the shuffled board to the console
+        self.debug = debug
+        rgb = None
+        if solution is None and cache is not None:
+            # A stored palette for this seed, or any palette no game has used yet
+            if seed is None:
+                taken = cache.take_unplayed(size, strategy)
+                if taken is not None:
+                    seed, rgb = taken
+            else:
+                rgb = cache.get(size, strategy, seed)
+        self.generator = ColorGenerator(size, seed, strategy)
+        self.seed = self.generator.seed
+        self.strategy = self.generator.strategy
+        # The shuffle has its own stream, so the same seed gives the same game whether the
+        # palette was generated or read from the cache
+        self.random = Random(f"{self.seed}:shuffle")
+        # Whether (size, strategy, seed) still reproduces the palette, e.g. for a compact save
+        self.from_seed = solution is None
+        if solution is not None:
+            packed = np.array([int(color[1:], 16) for row in solution for color in row])
+        else:
+            if rgb is None:
+                rgb = self.generator.generate_board_rgb(self.size)
+                if cache is not None:
+                    cache.put(size, self.strategy, self.seed, rgb)
+            packed = pack_rgb_array(rgb).ravel()
+        self.load_solution(packed)
+        # Without the shuffle the board starts solved, for callers that restore their own state
+        cells = self.shuffle_board_from_solution() if shuffle else array("H", self.solution_cells)
+        self.restore(cells)
+
+    def restore(self, cells: array):
+        # Put the board in a given state, e.g. the shuffled start or a saved game
+        self.board_cells = cells
+        # One byte per cell, set where its color differs from the solution, plus their count.
+        # Both are kept up to date by set_cell, so checking for a win is O(1) and a hint only
+        # searches the flags in C
+        board = np.frombuffer(cells, dtype=np.uint16)
+        misplaced = board != np.frombuffer(self.solution_cells, dtype=np.uint16)
+        self.misplaced_flags = bytearray(misplaced.tobytes())
+        self.misplaced = int(np.count_nonzero(misplaced))
+
+    def load_solution(self, packed: np.ndarray):
+        # The palette holds every distinct color once, as packed RGB bytes plus its hex string.
+        # The solution and the board are flat row-major arrays of palette indices, so moves and
+        # comparisons are integer operations
+        values, inverse = np.unique(packed, return_inverse=True)
+        inverse = inverse.ravel()
+        # With repeated colors the solver's move count is only an upper bound
+        self.repeated_colors = len(values) < len(packed)
+        self.palette_rgb = array("B", unpack_rgb_array(values).tobytes())
+        self.palette = ["#%06x" % value for value in values.tolist()]
+        # Packed 0xrrggbb per palette entry. The generated colors come sorted, so a color is
+        # found by bisection; colors appended later are searched one by one
+        self.palette_values = array("I", values.astype(np.uint32).tobytes())
+        self.sorted_colors = len(values)
+        self.solution_cells = array("H", inverse.astype(np.uint16).tobytes())
+        # Where every color belongs, built once: the positions grouped by color, and where each
+        # color's group starts. Duplicate colors keep all their positions
+        order = np.argsort(inverse, kind="stable")
+        self.solution_positions = array("H", order.astype(np.uint16).tobytes())
+        starts = np.zeros(len(values) + 1, dtype=np.uint32)
+        np.cumsum(np.bincount(inverse, minlength=len(values)), out=starts[1:])
+        self.solution_offsets = array("I", starts.tobytes())
+
+    def palette_index(self, color: str) -> int:
+        # Colors from outside the generated palette are appended to it
+        value = int(color[1:], 16)
+        index = bisect_left(self.palette_values, value, 0, self.sorted_colors)
+        if index < self.sorted_colors and self.palette_values[index] == value:
+            return index
+        for index in range(self.sorted_colors, len(self.palette)):
+            if self.palette_values[index] == value:
+                return index
+        index = len(self.palette)
+        self.from_seed = False
+        self.palette.append(color)
+        self.palette_values.append(value)
+        self.palette_rgb.frombytes(bytes.fromhex(color[1:]))
+        # No position in the solution wants the new color
+        self.solution_offsets.append(self.solution_offsets[-1])
+        return index
+
+    def position(self, coords: Coordinates) -> int:
+        return coords.row * self.size + coords.col
+
+    def coordinates(self, position: int) -> Coordinates:
+        return Coordinates(*divmod(position, self.size))
+
+    def to_grid(self, cells: array) -> list[list[str]]:
+        colors = [self.palette[color_index] for color_index in cells]
+        return [colors[row * self.size:(row + 1) * self.size] for row in range(self.size)]
+
+    @property
+    def solution(self) -> list[list[str]]:
+        return self.to_grid(self.solution_cells)
+
+    @property
+    def board(self) -> list[list[str]]:
+        return self.to_grid(self.board_cells)
+
+    def shuffle_board_from_solution(self) -> array:
+        cells = self.solution_cells
+        # Shuffle positions rather than colors: a random permutation of the non-pinned cells,
+        # applied in one pass. Corners stay put and repeated colors need no special handling
+        pinned = PinnedPoints(self.size).flat_indices()
+        free = [index for index in range(len(cells)) if index not in pinned]
+        can_shuffle = len({cells[index] for index in free}) > 1
+        shuffled = array("H", cells)
+        while True:
+            for index, source in zip(free, self.random.sample(free, len(free))):
+                shuffled[index] = cells[source]
+            # Don't hand out a board that is already solved
+            if shuffled != cells or not can_shuffle:
+                break
+        if self.debug:
+            print(self.to_grid(shuffled))
+        return shuffled
+
+    def count_misplaced(self) -> int:
+        cells = zip(self.board_cells, self.solution_cells)
+        return sum(cell != solution_cell for cell, solution_cell in cells)
 
     def check_solved(self) -> bool:
-        return self.solution == self.board
+        return not self.misplaced
+
+    def misplaced_positions(self) -> list[int]:
+        return np.flatnonzero(np.frombuffer(self.misplaced_flags, dtype=np.uint8)).tolist()
 
     def get_cell(self, coords: Coordinates):
-        return self.board[coords.row][coords.col]
+        return self.palette[self.board_cells[self.position(coords)]]
 
     def get_solution_cell(self, coords: Coordinates):
-        return self.solution[coords.row][coords.col]
+        return self.palette[self.solution_cells[self.position(coords)]]
+
+    def set_cell(self, position: int, color_index: int):
+        self.board_cells[position] = color_index
+        misplaced = color_index != self.solution_cells[position]
+        self.misplaced += misplaced - self.misplaced_flags[position]
+        self.misplaced_flags[position] = misplaced
 
     def set_color(self, coords: Coordinates, color: str):
-        self.board[coords.row][coords.col] = color
-
-    def hint(self) -> tuple[Coordinates, Coordinates]:
-        first_coords = Coordinates.random(self.size)
-        first_color = self.get_cell(first_coords)
-        where_to_place = self.find_coords_of_color(self.solution, first_color)
-        while first_coords == where_to_place:
-            first_coords = Coordinates.random(self.size)
-            first_color = self.get_cell(first_coords)
-            where_to_place = self.find_coords_of_color(self.solution, first_color)
-        return first_coords, where_to_place
+        self.set_cell(self.position(coords), self.palette_index(color))
+
+    def swap(self, first: Coordinates, second: Coordinates) -> tuple[str, str]:
+        # Returns the new colors at first and second
+        first_position, second_position = self.position(first), self.position(second)
+        first_color = self.board_cells[first_position]
+        second_color = self.board_cells[second_position]
+        self.set_cell(first_position, second_color)
+        self.set_cell(second_position, first_color)
+        return self.palette[second_color], self.palette[first_color]
+
+    def hint(self) -> Optional[tuple[Coordinates, Coordinates]]:
+        # Any misplaced cell, and a spot in the solution that wants its color but doesn't have it
+        # yet. None when there is nothing left to hint, i.e. the board is solved
+        position = self.misplaced_flags.find(1)
+        if position < 0:
+            return None
+        color_index = self.board_cells[position]
+        start, end = self.solution_offsets[color_index], self.solution_offsets[color_index + 1]
+        for index in range(start, end):
+            target = self.solution_positions[index]
+            if self.board_cells[target] != color_index:
+                return self.coordinates(position), self.coordinates(target)
+        return None
+
+    def min_swaps(self) -> int:
+        return min_swaps(self.board_cells, self.solution_cells)
+
+    def solve(self) -> list[tuple[Coordinates, Coordinates]]:
+        return [
+            (self.coordinates(first), self.coordinates(second))
+            for first, second in optimal_swaps(self.board_cells, self.solution_cells)
+        ]
 
     def find_coords_of_color(self, board: list[list[str]], color: str) -> Coordinates:
         for row_ind in range(self.size):
@@ -119,15 +269,34 @@ class Board:
 
 
 class ColorLogic:
-    def __init__(self, board_size: int, ui: "QBoard", show_total_moves: bool = True):
+    def __init__(
+        self,
+        board_size: int,
+        ui: "QBoard",
+        show_total_moves: bool = True,
+        board: Optional[Board] = None,
+        seed: Optional[int] = None,
+        strategy: str = DEFAULT_STRATEGY,
+        total_moves: int = 0,
+        optimal_moves: Optional[int] = None,
+    ):
         self.board_size = board_size
-        self.color_board = Board(board_size)
+        # A ready-made board (e.g. from BoardPrefetcher) skips generation on the GUI thread
+        self.color_board = board or Board(board_size, seed=seed, strategy=strategy)
         self.selected: Optional[Coordinates] = None
-        self.total_moves = 0
+        # Both are given when a saved game is resumed part-way through
+        self.total_moves = total_moves
+        # The fewest swaps that solve the starting board, to compare the player's moves against
+        if optimal_moves is None:
+            optimal_moves = self.color_board.min_swaps()
+        self.optimal_moves = optimal_moves
+        self.optimal_is_exact = not self.color_board.repeated_colors
         self.solution = self.color_board.solution
         self.completed: bool = False
         self.show_total_moves = show_total_moves
         self.ui = ui
+        # Autosave: every swap is appended to the journal as it happens
+        self.journal: Optional["GameJournal"] = None
 
     def select_and_swap(self, coords: Coordinates):
         if not self.selected:
@@ -137,16 +306,20 @@ class ColorLogic:
             self.selected = None
             self.ui.reset_selection(coords)
         else:
-            first_color = self.color_board.get_cell(self.selected)
-            second_color = self.color_board.get_cell(coords)
-            self.color_board.set_color(self.selected, second_color)
-            self.color_board.set_color(coords, first_color)
+            second_color, first_color = self.color_board.swap(self.selected, coords)
             self.total_moves += 1
+            if self.journal:
+                board = self.color_board
+                self.journal.record_swap(board.position(self.selected), board.position(coords))
             self.ui.highlight_button(self.selected, second_color)
             self.ui.highlight_button(coords, first_color)
             self.selected = None
             if self.color_board.check_solved():
                 self.completed = True
+                # A finished game has nothing left to resume
+                if self.journal:
+                    self.journal.discard()
+                    self.journal = None
                 self.show_win()
 
     def show_win(self):
@@ -154,5 +327,9 @@ class ColorLogic:
         if self.show_total_moves:
             total_moves_str = "moves" if self.total_moves > 1 else "move"
             win_str += f" You took {self.total_moves} {total_moves_str} to complete the game"
+            if self.optimal_is_exact:
+                win_str += f" (the best possible was {self.optimal_moves})"
+            else:
+                win_str += f" (the best possible was about {self.optimal_moves})"
         print(win_str)
-        self.ui.show_win(self.total_moves)
+        self.ui.show_win(self.total_moves, self.optimal_moves, exact=self.optimal_is_exact)
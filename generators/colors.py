@@ -1,9 +1,20 @@
 from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional
 import colorsys
+import mmap
+import os
+import struct
+import tempfile
+import numpy as np
 from PIL import ImageColor
 
 # Conversion: HSL -> HLS -> RGB -> Hex
 
+# Same constants as colorsys, so the array conversions round exactly like HSL.to_hex
+ONE_THIRD = 1.0 / 3.0
+ONE_SIXTH = 1.0 / 6.0
+TWO_THIRD = 2.0 / 3.0
+
 
 @dataclass
 class RGB:
@@ -67,6 +78,8 @@ class HSL:
         return (self.h / 360, self.l / 100, self.s / 100)
 
     def to_hex(self) -> str:
+        if _lookup_table:
+            return _lookup_table.hsl_to_hex(self.h, self.s, self.l)
         rgb = RGB(*[round(255 * x) for x in colorsys.hls_to_rgb(*self.to_hls())])
         return rgb.to_hex()
 
@@ -94,5 +107,205 @@ class HSL:
 
     @classmethod
     def from_hex(cls, hex: str) -> "HSL":
+        if _lookup_table and _lookup_table.reverse is not None and len(hex) == 7:
+            return HSL(*_lookup_table.hex_to_hsl(hex))
         h, l, s = RGB.from_hex(hex).to_hls()
         return HSL.from_hls(h, l, s)
+
+
+def _hue_to_channel(m1: np.ndarray, m2: np.ndarray, hue: np.ndarray) -> np.ndarray:
+    # Array version of colorsys._v, keeping the same order of floating point operations
+    hue = np.mod(hue, 1.0)
+    return np.select(
+        [hue < ONE_SIXTH, hue < 0.5, hue < TWO_THIRD],
+        [m1 + (m2 - m1) * hue * 6.0, m2, m1 + (m2 - m1) * (TWO_THIRD - hue) * 6.0],
+        default=m1,
+    )
+
+
+def hsl_array_to_rgb(hsl: np.ndarray) -> np.ndarray:
+    # (..., 3) integer HSL -> (..., 3) uint8 RGB, matching HSL.to_hex cell by cell
+    hsl = np.asarray(hsl)
+    if _lookup_table:
+        return _lookup_table.forward_array[hsl[..., 0], hsl[..., 1], hsl[..., 2]]
+    h = hsl[..., 0] / 360
+    s = hsl[..., 1] / 100
+    l = hsl[..., 2] / 100  # noqa: E741
+    m2 = np.where(l <= 0.5, l * (1.0 + s), l + s - (l * s))
+    m1 = 2.0 * l - m2
+    rgb = np.stack([
+        _hue_to_channel(m1, m2, h + ONE_THIRD),
+        _hue_to_channel(m1, m2, h),
+        _hue_to_channel(m1, m2, h - ONE_THIRD),
+    ], axis=-1)
+    # Greys skip the hue maths in colorsys
+    rgb = np.where((s == 0.0)[..., np.newaxis], l[..., np.newaxis], rgb)
+    # np.rint rounds half to even, like the built-in round
+    return np.rint(255 * rgb).astype(np.uint8)
+
+
+def pack_rgb_array(rgb: np.ndarray) -> np.ndarray:
+    # (..., 3) uint8 RGB -> (...) uint32 0xrrggbb
+    rgb = np.asarray(rgb, dtype=np.uint32)
+    return (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+
+
+def unpack_rgb_array(packed: np.ndarray) -> np.ndarray:
+    # (...) 0xrrggbb -> (..., 3) uint8 RGB
+    packed = np.asarray(packed, dtype=np.uint32)
+    return np.stack([packed >> 16, (packed >> 8) & 0xff, packed & 0xff], axis=-1).astype(np.uint8)
+
+
+def rgb_array_to_hex(rgb: np.ndarray) -> list:
+    # (..., 3) uint8 RGB -> nested lists of '#rrggbb' strings with the same shape as (...)
+    packed = pack_rgb_array(rgb)
+    result: list = ["#%06x" % value for value in packed.ravel().tolist()]
+    # Regroup the flat list from the innermost dimension outwards
+    for dim in reversed(packed.shape[1:]):
+        result = [result[i:i + dim] for i in range(0, len(result), dim)]
+    return result
+
+
+def rgb_array_to_hsl(rgb: np.ndarray) -> np.ndarray:
+    # (..., 3) uint8 RGB -> (..., 3) integer HSL, matching HSL.from_hex cell by cell
+    rgb = np.asarray(rgb) / 255
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    maxc = rgb.max(axis=-1)
+    minc = rgb.min(axis=-1)
+    sumc = maxc + minc
+    rangec = maxc - minc
+    l = sumc / 2.0  # noqa: E741
+    grey = minc == maxc
+    # Greys divide by zero here; their hue and saturation are replaced with 0 below
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s = np.where(l <= 0.5, rangec / sumc, rangec / (2.0 - maxc - minc))
+        rc = (maxc - r) / rangec
+        gc = (maxc - g) / rangec
+        bc = (maxc - b) / rangec
+        h = np.where(r == maxc, bc - gc, np.where(g == maxc, 2.0 + rc - bc, 4.0 + gc - rc))
+        h = np.mod(h / 6.0, 1.0)
+    h = np.where(grey, 0.0, h)
+    s = np.where(grey, 0.0, s)
+    return np.rint(np.stack([h * 360, s * 100, l * 100], axis=-1)).astype(np.int64)
+
+
+# OKLab (Björn Ottosson, 2020): a perceptual space where Euclidean distance tracks how different
+# two colors look. 8-bit sRGB channels go to linear light through a 256-entry table
+_srgb = np.arange(256) / 255
+SRGB_TO_LINEAR = np.where(
+    _srgb <= 0.04045, _srgb / 12.92, ((_srgb + 0.055) / 1.055) ** 2.4
+).astype(np.float32)
+LINEAR_RGB_TO_LMS = np.array([
+    [0.4122214708, 0.5363325363, 0.0514459929],
+    [0.2119034982, 0.6806995451, 0.1073969566],
+    [0.0883024619, 0.2817188376, 0.6299787005],
+], dtype=np.float32)
+LMS_TO_OKLAB = np.array([
+    [0.2104542553, 0.7936177850, -0.0040720468],
+    [1.9779984951, -2.4285922050, 0.4505937099],
+    [0.0259040371, 0.7827717662, -0.8086757660],
+], dtype=np.float32)
+
+
+def rgb_array_to_oklab(rgb: np.ndarray) -> np.ndarray:
+    # (..., 3) uint8 RGB -> (..., 3) float32 OKLab (L in 0-1)
+    linear = SRGB_TO_LINEAR[np.asarray(rgb)]
+    return np.cbrt(linear @ LINEAR_RGB_TO_LMS.T) @ LMS_TO_OKLAB.T
+
+
+# Optional lookup table backend. The generator only produces integer HSL triples, so every
+# HSL -> RGB result fits in a 361 x 101 x 101 x 3 byte table (about 11 MB). The table is built
+# once, written to disk and memory-mapped read-only, so every game process on the machine
+# shares the same pages. The reverse table (RGB -> HSL, 2^24 x 4 bytes) is opt-in
+HSL_TABLE_SHAPE = (361, 101, 101, 3)
+HSL_TABLE_FILE = "hsl_to_rgb.lut"
+RGB_TABLE_FILE = "rgb_to_hsl.lut"
+# Reverse table entries: hue as a little-endian uint16, then saturation and lightness bytes
+RGB_TABLE_ENTRY = struct.Struct("<HBB")
+RGB_TABLE_DTYPE = np.dtype([("h", "<u2"), ("s", "u1"), ("l", "u1")])
+
+
+def default_lookup_table_dir() -> str:
+    return os.path.join(os.path.expanduser("~"), ".cache", "colors")
+
+
+def _write_atomically(path: str, chunks: Iterable[bytes]):
+    # Other processes may be mapping the same file, so never expose a half-written table
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as file:
+            for chunk in chunks:
+                file.write(chunk)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def _map_file(path: str, size: int) -> Optional[mmap.mmap]:
+    if not os.path.exists(path) or os.path.getsize(path) != size:
+        return None
+    with open(path, "rb") as file:
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def build_hsl_table() -> Iterator[bytes]:
+    # One hue at a time, in file order, so only a 101 x 101 slice is ever in memory
+    s, l = np.meshgrid(np.arange(101), np.arange(101), indexing="ij")  # noqa: E741
+    for h in range(HSL_TABLE_SHAPE[0]):
+        yield hsl_array_to_rgb(np.stack([np.full_like(s, h), s, l], axis=-1)).tobytes()
+
+
+def build_rgb_table() -> Iterator[bytes]:
+    # One red plane (2^16 colors) at a time
+    plane = np.arange(1 << 16)
+    for red in range(256):
+        hsl = rgb_array_to_hsl(unpack_rgb_array((red << 16) | plane))
+        table = np.empty(len(hsl), dtype=RGB_TABLE_DTYPE)
+        table["h"], table["s"], table["l"] = hsl[:, 0], hsl[:, 1], hsl[:, 2]
+        yield table.tobytes()
+
+
+class HSLLookupTable:
+    def __init__(self, directory: str, reverse: bool = False):
+        self.directory = directory
+        self.forward = self.load(HSL_TABLE_FILE, int(np.prod(HSL_TABLE_SHAPE)), build_hsl_table)
+        self.forward_array = np.frombuffer(self.forward, dtype=np.uint8).reshape(HSL_TABLE_SHAPE)
+        self.reverse: Optional[mmap.mmap] = None
+        if reverse:
+            self.reverse = self.load(RGB_TABLE_FILE, RGB_TABLE_ENTRY.size << 24, build_rgb_table)
+
+    def load(self, filename: str, size: int, build) -> mmap.mmap:
+        path = os.path.join(self.directory, filename)
+        table = _map_file(path, size)
+        if table is None:
+            _write_atomically(path, build())
+            table = _map_file(path, size)
+        assert table is not None, f"Could not map the lookup table {path}"
+        return table
+
+    def hsl_to_hex(self, h: int, s: int, l: int) -> str:  # noqa: E741
+        offset = ((h * 101 + s) * 101 + l) * 3
+        return "#" + self.forward[offset:offset + 3].hex()
+
+    def hex_to_hsl(self, hex: str) -> tuple[int, int, int]:
+        offset = int(hex[1:], 16) * RGB_TABLE_ENTRY.size
+        return RGB_TABLE_ENTRY.unpack_from(self.reverse, offset)  # type: ignore[arg-type]
+
+
+_lookup_table: Optional[HSLLookupTable] = None
+
+
+def enable_lookup_table(directory: Optional[str] = None, reverse: bool = False) -> HSLLookupTable:
+    # Build the tables on first use, then memory-map them for HSL.to_hex/from_hex and the
+    # array conversions. Raises OSError when the directory is not writable
+    global _lookup_table
+    _lookup_table = HSLLookupTable(directory or default_lookup_table_dir(), reverse)
+    return _lookup_table
+
+
+def disable_lookup_table():
+    global _lookup_table
+    _lookup_table = None
@@ -0,0 +1,68 @@
+import numpy as np
+if __package__:
+    from generators.colors import pack_rgb_array, rgb_array_to_oklab
+else:
+    # Imported by hsl_color_generator.py run as a script
+    from colors import pack_rgb_array, rgb_array_to_oklab
+
+# Checks that a generated board is unambiguous: no color appears twice, and no two neighbouring
+# cells are (nearly) indistinguishable. Everything works on (..., size, size, 3) uint8 RGB, so a
+# whole batch of boards is scored in one pass
+
+# OKLab distance below which neighbouring colors are hard to tell apart; a just noticeable
+# difference is about 0.02
+MIN_NEIGHBOUR_DELTA_E = 0.01
+# A gradient spreads its colors over size - 1 steps, so on larger boards neighbours are
+# necessarily closer: the threshold shrinks to this distance per board width
+GRADIENT_DELTA_E = 0.04
+# Larger boards are scored once but never redrawn: integer HSL steps repeat colors on most
+# draws there (38-73% of 32x32 boards still fail after every redraw), so redraws mostly cost time
+MAX_REDRAWN_SIZE = 24
+# Boards drawn before settling for the most distinct one
+MAX_ATTEMPTS = 4
+
+
+def duplicate_counts(rgb: np.ndarray) -> np.ndarray:
+    # Cells per board whose color already appeared elsewhere on that board
+    packed = pack_rgb_array(rgb)
+    packed = np.sort(packed.reshape(*packed.shape[:-2], -1), axis=-1)
+    return np.count_nonzero(packed[..., 1:] == packed[..., :-1], axis=-1)
+
+
+def min_neighbour_delta_e(rgb: np.ndarray) -> np.ndarray:
+    # Smallest OKLab distance between horizontally or vertically adjacent cells, per board
+    lab = rgb_array_to_oklab(rgb)
+    across = lab[..., :, 1:, :] - lab[..., :, :-1, :]
+    down = lab[..., 1:, :, :] - lab[..., :-1, :, :]
+    # Squared distances without the temporaries of np.square(...).sum(axis=-1)
+    across = np.einsum("...k,...k->...", across, across)
+    down = np.einsum("...k,...k->...", down, down)
+    closest = np.minimum(across.min(axis=(-2, -1)), down.min(axis=(-2, -1)))
+    return np.sqrt(closest)
+
+
+def score_boards(rgb: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    return duplicate_counts(rgb), min_neighbour_delta_e(rgb)
+
+
+def neighbour_threshold(size: int, threshold: float = MIN_NEIGHBOUR_DELTA_E) -> float:
+    # The neighbour distance a size x size board has to reach, at most threshold
+    return min(threshold, GRADIENT_DELTA_E / (size - 1))
+
+
+def is_distinct(
+    duplicates: np.ndarray, delta_e: np.ndarray, threshold: float = MIN_NEIGHBOUR_DELTA_E
+) -> np.ndarray:
+    return (duplicates == 0) & (delta_e >= threshold)
+
+
+def more_distinct(
+    duplicates: np.ndarray,
+    delta_e: np.ndarray,
+    than_duplicates: np.ndarray,
+    than_delta_e: np.ndarray,
+) -> np.ndarray:
+    # Fewer duplicates first, then the larger smallest neighbour distance
+    return (duplicates < than_duplicates) | (
+        (duplicates == than_duplicates) & (delta_e > than_delta_e)
+    )
@@ -1,20 +1,93 @@
-from random import randint
+from dataclasses import dataclass
+from random import Random
+from secrets import randbits
+import numpy as np
 from PIL import Image
-from typing import Any, Optional
+from typing import Any, Callable, Optional
 if __name__ == "__main__":
-    from vector_math import Vector, points_on_a_circle
-    from colors import HSL, RGB
+    from vector_math import Vector, points_on_a_circle, points_on_circles
+    from colors import HSL, RGB, hsl_array_to_rgb, rgb_array_to_hex
+    from palette_png import ProgressCallback, write_palette_png
+    from distinctness import (
+        MAX_ATTEMPTS,
+        MAX_REDRAWN_SIZE,
+        MIN_NEIGHBOUR_DELTA_E,
+        is_distinct,
+        more_distinct,
+        neighbour_threshold,
+        score_boards,
+    )
     import matplotlib.pyplot as plt
 else:
-    from generators.vector_math import Vector, points_on_a_circle
-    from generators.colors import HSL, RGB
+    from generators.vector_math import Vector, points_on_a_circle, points_on_circles
+    from generators.colors import HSL, RGB, hsl_array_to_rgb, rgb_array_to_hex
+    from generators.palette_png import ProgressCallback, write_palette_png
+    from generators.distinctness import (
+        MAX_ATTEMPTS,
+        MAX_REDRAWN_SIZE,
+        MIN_NEIGHBOUR_DELTA_E,
+        is_distinct,
+        more_distinct,
+        neighbour_threshold,
+        score_boards,
+    )
 import sys
 import copy
 
+# Width and height in pixels of one color in exported palette images
+DEFAULT_CELL_SIZE = 200
+# Cells per chunk in batch generation, to bound the intermediate HSL arrays
+BATCH_CHUNK_CELLS = 1 << 20
+# The circle strategies need a centre at least min_radius + CIRCLE_MARGIN from every bound
+# (room for min_radius + 2 < max_radius - 2)
+CIRCLE_MARGIN = 5
+# How a board's four corners are picked (see CORNER_STRATEGIES); part of a board's identity
+# together with its size and seed
+DEFAULT_STRATEGY = "smaller_range"
+# Saved games store the strategy name in a fixed 16-byte field
+MAX_STRATEGY_NAME = 16
+
+
+@dataclass
+class BatchStats:
+    boards: int = 0
+    # Corner sets that left the HSL space and had to be drawn again
+    out_of_bounds: int = 0
+    # Boards drawn again because colors repeated or neighbours were too alike
+    redrawn: int = 0
+    # Boards kept as the most distinct attempt without passing the check (boards larger than
+    # MAX_REDRAWN_SIZE get a single attempt)
+    indistinct: int = 0
+
+
+def new_seed() -> int:
+    # Fits a signed 64-bit integer, e.g. an SQLite key
+    return randbits(63)
+
+
+def corners_to_array(corners: list[list[HSL]]) -> np.ndarray:
+    # [[tl, tr], [bl, br]] HSL -> (2, 2, 3) int64
+    return np.array([[[c.h, c.s, c.l] for c in row] for row in corners], dtype=np.int64)
+
 
 class ColorGenerator:
-    def __init__(self, size: int):
+    def __init__(self, size: int, seed: Optional[int] = None, strategy: str = DEFAULT_STRATEGY):
+        assert strategy in CORNER_STRATEGIES, f"Unknown corner strategy {strategy!r}"
         self.size = size
+        # Every random draw comes from these two instance generators, so (size, strategy, seed)
+        # fully identifies a board and can be regenerated anywhere, in any process
+        self.seed = new_seed() if seed is None else seed
+        self.strategy = strategy
+        self.corner_strategy = CORNER_STRATEGIES[strategy]
+        # Distinctness check at generation time, with the neighbour threshold scaled down for
+        # larger boards (see neighbour_threshold); max_attempts = 1 turns it off
+        self.min_delta_e = MIN_NEIGHBOUR_DELTA_E
+        self.max_attempts = MAX_ATTEMPTS
+        self.random = Random(self.seed)
+        self.np_random = np.random.default_rng(self.seed)
+        self.last_batch_stats = BatchStats()
+        # Running totals for every single board generated
+        self.board_stats = BatchStats()
 
     def expand_colors_to_board(self, colors: list[list[Any]], mult: int = 200) -> list[list[Any]]:
         n = mult
@@ -27,20 +100,39 @@ class ColorGenerator:
         return new_board
 
     def random_color(self) -> HSL:
+        randint = self.random.randint
         return HSL(randint(0, 360), randint(0, 100), randint(0, 100))
 
-    def create_color_image(self, colors: list[list[str]], filename: Optional[str] = None):
-        new = self.expand_colors_to_board(colors, 200)
-        i = Image.new("RGBA", (len(new), len(new[0])))
-        for r in range(len(new)):
-            for c in range(len(new)):
-                # c is x, r is y.
-                i.putpixel((c, r), RGB.from_hex(new[r][c]).as_tuple())
+    def create_color_image(
+        self,
+        colors: list[list[str]],
+        filename: Optional[str] = None,
+        cell_size: int = DEFAULT_CELL_SIZE,
+    ):
+        # Parse each color once, then fill every cell as a solid cell_size x cell_size block
+        palette = np.array(
+            [[RGB.from_hex(color).as_tuple() + (255,) for color in row] for row in colors],
+            dtype=np.uint8,
+        )
+        pixels = palette.repeat(cell_size, axis=0).repeat(cell_size, axis=1)
+        i = Image.fromarray(pixels)
         if filename:
-            i.save(filename)
+            # Solid blocks compress well even at the fastest zlib level
+            i.save(filename, compress_level=1)
         else:
             i.show()
 
+    def stream_color_image(
+        self,
+        colors: list[list[str]],
+        filename: str,
+        cell_size: int = DEFAULT_CELL_SIZE,
+        progress: Optional[ProgressCallback] = None,
+    ):
+        # Same picture as create_color_image, but written band by band straight to disk.
+        # Memory stays bounded by one scanline, which matters for large boards and cells
+        write_palette_png(colors, filename, cell_size, progress)
+
     def linear_gradient(self, color1: HSL, color2: HSL, size: int) -> list[HSL]:
         result = []
         color_vector = Vector(color2.h - color1.h, color2.s - color1.s, color2.l - color1.l)
@@ -57,7 +149,24 @@ class ColorGenerator:
             result.append(hsl)
         return result
 
-    def full_color_image(self) -> tuple[list[HSL], list[HSL]]:
+    def linear_gradient_array(self, start: np.ndarray, end: np.ndarray, size: int) -> np.ndarray:
+        # Array version of linear_gradient: (..., 3) HSL ends -> (..., size, 3) HSL steps.
+        # The arithmetic mirrors linear_gradient so both paths round to the same integers
+        start = np.asarray(start, dtype=np.int64)[..., np.newaxis, :]
+        end = np.asarray(end, dtype=np.int64)[..., np.newaxis, :]
+        vector_step = (end - start) / (size - 1)
+        steps = np.arange(size)[:, np.newaxis]
+        return np.rint(start + steps * vector_step).astype(np.int64)
+
+    def bilinear_gradient_array(self, corners: np.ndarray, size: int) -> np.ndarray:
+        # (..., 2, 2, 3) HSL corners [[tl, tr], [bl, br]] -> (..., size, size, 3) HSL board.
+        # Columns first, then rows between them, exactly like generate_board
+        corners = np.asarray(corners, dtype=np.int64)
+        leftcol = self.linear_gradient_array(corners[..., 0, 0, :], corners[..., 1, 0, :], size)
+        rightcol = self.linear_gradient_array(corners[..., 0, 1, :], corners[..., 1, 1, :], size)
+        return self.linear_gradient_array(leftcol, rightcol, size)
+
+    def full_color_image(self) -> list[list[HSL]]:
         # Compare h <-> l relations
         # pin = randint(10, 80)
         # tl = HSL(0, pin, 0)
@@ -69,13 +178,13 @@ class ColorGenerator:
         tr = HSL(0, 30, 50)
         bl = HSL(360, 0, 50)
         br = HSL(360, 30, 50)
-        return [tl, tr], [bl, br]
+        return [[tl, tr], [bl, br]]
+
+    def generate_corners(self) -> list[list[HSL]]:
+        return self.corner_strategy.corners(self)
 
     def generate_board(self, size: int) -> list[list[HSL]]:
-        # [tl, tr], [bl, br] = self.generate_starting_points()
-        [tl, tr], [bl, br] = self.generate_points_from_circle_smaller_range()
-        # [tl, tr], [bl, br] = self.full_color_image()
-        # [tl, tr], [bl, br] = self.generate_points_from_circle_across_colors()
+        [tl, tr], [bl, br] = self.generate_corners()
         results = []
         rightcol = self.linear_gradient(tr, br, size)
         leftcol = self.linear_gradient(tl, bl, size)
@@ -84,7 +193,7 @@ class ColorGenerator:
         return results
 
     def rotate_points(self, points: list[list[HSL]]) -> list[list[HSL]]:
-        random_direction = randint(1, 4)
+        random_direction = self.random.randint(1, 4)
         match random_direction:
             case 1:
                 return points
@@ -104,8 +213,8 @@ class ColorGenerator:
         return points
 
     def generate_starting_points(self) -> list[list[HSL]]:
-        saturation = randint(0, 100)
-        points = [(randint(0, 360), randint(0, 100)) for _ in range(4)]
+        saturation = self.random.randint(0, 100)
+        points = [(self.random.randint(0, 360), self.random.randint(0, 100)) for _ in range(4)]
         # Sort based on the x-axis. First two points are on the left, last two - on the right
         points.sort(key=lambda x: x[1])
         sorted_y = copy.deepcopy(points)
@@ -116,55 +225,197 @@ class ColorGenerator:
         top.sort(key=lambda x: x[0])  # Min X, max X -> left, right
         top = [HSL(h, saturation, l) for (h, l) in top]
         bottom = [HSL(h, saturation, l) for (h, l) in bottom]
-        corners = self.rotate_points([top, bottom])
-        print(f"Saturation: {saturation}, points: {[(y.h, y.l) for x in corners for y in x]}")
-        return corners
+        return self.rotate_points([top, bottom])
 
     def generate_points_from_circle_smaller_range(self) -> list[list[HSL]]:
-        centre = self.random_color()
+        min_radius = 30
+        # A centre needs room for a radius above min_radius + 2 and saturation above 20. The
+        # feasible centres form a box, so drawing uniformly from it gives the same distribution
+        # as redrawing random colors until one fits, in a single draw
+        min_distance = min_radius + CIRCLE_MARGIN
+        centre = HSL(
+            self.random.randint(min_distance, 360 - min_distance),
+            self.random.randint(21, 100),
+            self.random.randint(min_distance, 100 - min_distance),
+        )
         pin = centre.s
         # Largest circle before we reach the HSL limits
         max_radius = centre.min_distance_to_bounds()
-        min_radius = 30
-        while min_radius + 2 >= max_radius - 2 or pin <= 20:
-            centre = self.random_color()
-            pin = centre.s
-            max_radius = centre.min_distance_to_bounds()
-        radius = randint(min_radius + 1, max_radius - 1)
+        radius = self.random.randint(min_radius + 1, max_radius - 1)
         # Generate points
-        points = points_on_a_circle((centre.h, centre.l), radius)
+        points = points_on_a_circle((centre.h, centre.l), radius, self.random)
         points = [HSL(h, pin, l) for h, l in points]
         points = [points[:2], points[2:]]
         return points
 
     def generate_points_from_circle_across_colors(self) -> list[list[HSL]]:
-        centre = (randint(0, 100), randint(0, 100))
-        pin = randint(5, 90)
+        min_radius = 10
+        # Same idea as above: every coordinate and the pin (5-90) needs min_radius + 5 room
+        min_distance = min_radius + CIRCLE_MARGIN
+        centre = (
+            self.random.randint(min_distance, 100 - min_distance),
+            self.random.randint(min_distance, 100 - min_distance),
+        )
+        pin = self.random.randint(max(5, min_distance), min(90, 100 - min_distance))
         # Largest circle before we reach the HSL limits
         max_radius = min(centre[0], centre[1], 100 - centre[0], 100 - centre[1], pin, 100 - pin)
-        min_radius = 10
-        while min_radius + 2 >= max_radius - 2:
-            centre = (randint(0, 100), randint(0, 100))
-            pin = randint(5, 90)
-            # Largest circle before we reach the HSL limits
-            max_radius = min(centre[0], centre[1], 100 - centre[0], 100 - centre[1], pin, 100 - pin)
-        radius = randint(min_radius + 1, max_radius - 1)
+        radius = self.random.randint(min_radius + 1, max_radius - 1)
 
         # Generate points
-        points = points_on_a_circle((centre[0], centre[1]), radius)
+        points = points_on_a_circle((centre[0], centre[1]), radius, self.random)
         points = [HSL(round(h * 3.6), pin, l) for h, l in points]
         points = [points[:2], points[2:]]
         return points
 
+    def generate_points_from_circle_smaller_range_batch(self, count: int) -> np.ndarray:
+        # Batched generate_points_from_circle_smaller_range: (count, 2, 2, 3) HSL corners
+        min_distance = 30 + CIRCLE_MARGIN
+        h = self.np_random.integers(min_distance, 360 - min_distance + 1, size=count)
+        pin = self.np_random.integers(21, 101, size=count)
+        l = self.np_random.integers(min_distance, 100 - min_distance + 1, size=count)  # noqa: E741
+        max_radius = np.minimum(np.minimum(h, 360 - h), np.minimum(l, 100 - l))
+        # integers() excludes the upper bound, like randint(31, max_radius - 1)
+        radii = self.np_random.integers(31, max_radius)
+        points = points_on_circles(np.stack([h, l], axis=-1), radii, self.np_random)
+        pins = np.broadcast_to(pin[:, np.newaxis, np.newaxis], (count, 4, 1))
+        corners = np.concatenate([points[..., :1], pins, points[..., 1:]], axis=-1)
+        return corners.reshape(count, 2, 2, 3)
+
+    def corners_in_bounds(self, corners: np.ndarray) -> np.ndarray:
+        # Batched HSL range assertions: which corner sets would construct valid HSL colors
+        corners = corners.reshape(len(corners), -1, 3)
+        in_bounds = (corners >= 0) & (corners <= np.array([360, 100, 100]))
+        return in_bounds.all(axis=(1, 2))
+
+    def generate_boards(self, size: int, count: int) -> np.ndarray:
+        # Many boards per call as one packed (count, size, size, 3) uint8 RGB array. Use
+        # rgb_array_to_hex on a slice to get the same hex boards as generate_initial_color_board
+        stats = BatchStats(boards=count)
+        self.last_batch_stats = stats
+        boards = np.empty((count, size, size, 3), dtype=np.uint8)
+        chunk = max(1, BATCH_CHUNK_CELLS // (size * size))
+        for start in range(0, count, chunk):
+            boards[start:start + chunk] = self.generate_distinct_boards(
+                size, min(chunk, count - start), stats
+            )
+        return boards
+
+    def generate_corners_batch(self, count: int, stats: BatchStats) -> np.ndarray:
+        corners = np.empty((0, 2, 2, 3), dtype=np.int64)
+        while len(corners) < count:
+            missing = count - len(corners)
+            if self.corner_strategy.batch:
+                batch = self.corner_strategy.batch(self, missing)
+            else:
+                # No vectorised version: one corner set at a time
+                batch = np.array([
+                    corners_to_array(self.generate_corners()) for _ in range(missing)
+                ])
+            in_bounds = self.corners_in_bounds(batch)
+            stats.out_of_bounds += int(np.count_nonzero(~in_bounds))
+            corners = np.concatenate([corners, batch[in_bounds]])
+        return corners
+
+    def generate_distinct_boards(self, size: int, count: int, stats: BatchStats) -> np.ndarray:
+        # Redraw only the boards that fail the distinctness check, keeping whichever attempt
+        # was more distinct, for at most max_attempts rounds
+        corners = self.generate_corners_batch(count, stats)
+        boards = hsl_array_to_rgb(self.bilinear_gradient_array(corners, size))
+        threshold = neighbour_threshold(size, self.min_delta_e)
+        duplicates, delta_e = score_boards(boards)
+        attempts = self.max_attempts if size <= MAX_REDRAWN_SIZE else 1
+        for _ in range(1, attempts):
+            retry = np.flatnonzero(~is_distinct(duplicates, delta_e, threshold))
+            if not retry.size:
+                break
+            stats.redrawn += int(retry.size)
+            corners = self.generate_corners_batch(retry.size, stats)
+            candidates = hsl_array_to_rgb(self.bilinear_gradient_array(corners, size))
+            new_duplicates, new_delta_e = score_boards(candidates)
+            better = more_distinct(new_duplicates, new_delta_e, duplicates[retry], delta_e[retry])
+            boards[retry[better]] = candidates[better]
+            duplicates[retry[better]] = new_duplicates[better]
+            delta_e[retry[better]] = new_delta_e[better]
+        distinct = is_distinct(duplicates, delta_e, threshold)
+        stats.indistinct += int(np.count_nonzero(~distinct))
+        return boards
+
+    def generate_board_array(self, size: int) -> np.ndarray:
+        # One board as (size, size, 3) integer HSL
+        return self.draw_board(size)[0]
+
+    def generate_board_rgb(self, size: int) -> np.ndarray:
+        # The same board as (size, size, 3) uint8 RGB, reusing the distinctness check's conversion
+        hsl, rgb = self.draw_board(size)
+        return hsl_array_to_rgb(hsl) if rgb is None else rgb
+
+    def draw_board(self, size: int) -> tuple[np.ndarray, Optional[np.ndarray]]:
+        # Redraw boards whose colors repeat or whose neighbours are too alike, up to
+        # max_attempts times, then settle for the most distinct one. Returns the HSL board and
+        # its RGB colors, or None for the RGB when the board wasn't checked
+        self.board_stats.boards += 1
+        hsl = self.bilinear_gradient_array(corners_to_array(self.generate_corners()), size)
+        if self.max_attempts == 1:
+            return hsl, None
+        threshold = neighbour_threshold(size, self.min_delta_e)
+        attempts = self.max_attempts if size <= MAX_REDRAWN_SIZE else 1
+        best = None
+        for attempt in range(attempts):
+            if attempt:
+                self.board_stats.redrawn += 1
+                hsl = self.bilinear_gradient_array(corners_to_array(self.generate_corners()), size)
+            rgb = hsl_array_to_rgb(hsl)
+            duplicates, delta_e = score_boards(rgb)
+            if is_distinct(duplicates, delta_e, threshold):
+                return hsl, rgb
+            if best is None or more_distinct(duplicates, delta_e, best[0], best[1]):
+                best = (duplicates, delta_e, hsl, rgb)
+        self.board_stats.indistinct += 1
+        return best[2], best[3]
+
     def generate_initial_color_board(self, size: int) -> list[list[str]]:
-        b = self.generate_board(size)
-        final_b = []
-        for row in b:
-            hex_row = []
-            for col in row:
-                hex_row.append(col.to_hex())
-            final_b.append(hex_row)
-        return final_b
+        # The whole board goes HSL -> RGB -> hex in a few array operations instead of per cell
+        return rgb_array_to_hex(self.generate_board_rgb(size))
+
+
+@dataclass
+class CornerStrategy:
+    # Picks [[tl, tr], [bl, br]] for one board
+    corners: Callable[[ColorGenerator], list[list[HSL]]]
+    # Optional vectorised version: (count, 2, 2, 3) HSL corners, where out-of-bounds sets are
+    # allowed and drawn again
+    batch: Optional[Callable[[ColorGenerator, int], np.ndarray]] = None
+    # Offered for new games; fixed or degenerate corners (e.g. the same board for every seed)
+    # are only for exports and benchmarks
+    playable: bool = True
+
+
+CORNER_STRATEGIES: dict[str, CornerStrategy] = {}
+
+
+def register_corner_strategy(
+    name: str,
+    corners: Callable[[ColorGenerator], list[list[HSL]]],
+    batch: Optional[Callable[[ColorGenerator, int], np.ndarray]] = None,
+    playable: bool = True,
+):
+    assert len(name.encode()) <= MAX_STRATEGY_NAME, f"Strategy names fit {MAX_STRATEGY_NAME} bytes"
+    CORNER_STRATEGIES[name] = CornerStrategy(corners, batch, playable)
+
+
+def playable_strategies() -> list[str]:
+    return [name for name, strategy in CORNER_STRATEGIES.items() if strategy.playable]
+
+
+register_corner_strategy(
+    "smaller_range",
+    ColorGenerator.generate_points_from_circle_smaller_range,
+    ColorGenerator.generate_points_from_circle_smaller_range_batch,
+)
+register_corner_strategy("across_colors", ColorGenerator.generate_points_from_circle_across_colors)
+register_corner_strategy("starting_points", ColorGenerator.generate_starting_points)
+# Fixed corners that ignore the seed, and a left column of identical greys
+register_corner_strategy("full_color_image", ColorGenerator.full_color_image, playable=False)
 
 
 if __name__ == "__main__":
@@ -213,12 +464,8 @@ if __name__ == "__main__":
         print("Testing")
         for j in range(3, size):
             print(f"Testing size {j}")
-            for i in range(10000):
-                try:
-                    board = cg.generate_initial_color_board(size)
-                except AssertionError:
-                    print(f"#{i} for size {j} - out of bounds")
-                    pass
+            cg.generate_boards(j, 10000)
+            print(f"Size {j}: {cg.last_batch_stats}")
 
     print("Drawing")
     points = []
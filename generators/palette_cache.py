@@ -0,0 +1,171 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, Optional
+import numpy as np
+from generators.colors import default_lookup_table_dir
+
+# Generated solutions stored by (size, strategy, seed) as raw (size, size, 3) uint8 RGB, so a new
+# game or a replay can skip generation. Entries the batch generator adds offline are "unplayed"
+# until a game takes them; entries touched least recently are evicted once the stored colors
+# exceed the byte cap
+DEFAULT_MAX_BYTES = 256 << 20
+CACHE_FILENAME = "palettes.sqlite"
+# Seconds to wait for another process (e.g. batch workers) to release a write lock
+BUSY_TIMEOUT = 30.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS palettes (
+    size INTEGER NOT NULL,
+    strategy TEXT NOT NULL,
+    seed INTEGER NOT NULL,
+    colors BLOB NOT NULL,
+    played INTEGER NOT NULL DEFAULT 0,
+    last_used INTEGER NOT NULL,
+    UNIQUE (size, strategy, seed)
+);
+CREATE INDEX IF NOT EXISTS palettes_lru ON palettes (last_used);
+CREATE INDEX IF NOT EXISTS palettes_unplayed ON palettes (size, strategy, played, last_used);
+-- Running total of the stored colors, so a put only evicts once the cap is exceeded
+CREATE TABLE IF NOT EXISTS palette_bytes (total INTEGER NOT NULL);
+CREATE TRIGGER IF NOT EXISTS palettes_added AFTER INSERT ON palettes BEGIN
+    UPDATE palette_bytes SET total = total + LENGTH(new.colors);
+END;
+CREATE TRIGGER IF NOT EXISTS palettes_removed AFTER DELETE ON palettes BEGIN
+    UPDATE palette_bytes SET total = total - LENGTH(old.colors);
+END;
+CREATE TRIGGER IF NOT EXISTS palettes_replaced AFTER UPDATE OF colors ON palettes BEGIN
+    UPDATE palette_bytes SET total = total + LENGTH(new.colors) - LENGTH(old.colors);
+END;
+"""
+
+# Least recently used entries first, through the palettes_lru index
+OLDEST = "SELECT rowid, LENGTH(colors) FROM palettes ORDER BY last_used, rowid LIMIT ?"
+# Rows read per step while evicting
+EVICT_CHUNK = 1000
+
+
+def default_cache_path() -> str:
+    return os.path.join(default_lookup_table_dir(), CACHE_FILENAME)
+
+
+class PaletteCache:
+    def __init__(self, path: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path or default_cache_path()
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # One connection shared by the GUI and the prefetch thread, serialised by the lock
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            self.path, timeout=BUSY_TIMEOUT, check_same_thread=False, isolation_level=None
+        )
+        with self.lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.executescript(SCHEMA)
+            with self.connection:
+                self.connection.execute("BEGIN IMMEDIATE")
+                if self.connection.execute("SELECT COUNT(*) FROM palette_bytes").fetchone()[0] == 0:
+                    # A new cache, or one from before the running total: count it once
+                    self.connection.execute(
+                        "INSERT INTO palette_bytes SELECT COALESCE(SUM(LENGTH(colors)), 0) "
+                        "FROM palettes"
+                    )
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM palettes").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    @staticmethod
+    def to_array(size: int, colors: bytes) -> np.ndarray:
+        return np.frombuffer(colors, dtype=np.uint8).reshape(size, size, 3)
+
+    def get(self, size: int, strategy: str, seed: int) -> Optional[np.ndarray]:
+        return self.get_many(size, strategy, [seed]).get(seed)
+
+    def get_many(self, size: int, strategy: str, seeds: Iterable[int]) -> dict[int, np.ndarray]:
+        seeds = list(seeds)
+        found: dict[int, np.ndarray] = {}
+        now = time.time_ns()
+        with self.lock, self.connection:
+            self.connection.execute("BEGIN")
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(seeds), 500):
+                chunk = seeds[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                query = f"seed IN ({marks}) AND size = ? AND strategy = ?"
+                rows = self.connection.execute(
+                    f"SELECT seed, colors FROM palettes WHERE {query}", (*chunk, size, strategy)
+                ).fetchall()
+                self.connection.execute(
+                    f"UPDATE palettes SET last_used = ? WHERE {query}",
+                    (now, *chunk, size, strategy),
+                )
+                for seed, colors in rows:
+                    found[seed] = self.to_array(size, colors)
+        return found
+
+    def put(self, size: int, strategy: str, seed: int, rgb: np.ndarray, played: bool = True):
+        self.put_many(size, strategy, [(seed, rgb)], played)
+
+    def put_many(
+        self,
+        size: int,
+        strategy: str,
+        entries: Iterable[tuple[int, np.ndarray]],
+        played: bool = False,
+    ):
+        now = time.time_ns()
+        rows = [
+            (size, strategy, seed, np.ascontiguousarray(rgb, dtype=np.uint8).tobytes(),
+             int(played), now)
+            for seed, rgb in entries
+        ]
+        with self.lock, self.connection:
+            self.connection.execute("BEGIN")
+            self.connection.executemany(
+                "INSERT INTO palettes (size, strategy, seed, colors, played, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (size, strategy, seed) "
+                "DO UPDATE SET last_used = excluded.last_used, "
+                "played = MAX(played, excluded.played)",
+                rows,
+            )
+            self.evict()
+
+    def evict(self):
+        # Drop the least recently used entries until the stored colors fit under max_bytes.
+        # Called with the lock held, inside a write transaction
+        total = self.connection.execute("SELECT total FROM palette_bytes").fetchone()[0]
+        while total > self.max_bytes:
+            evicted = []
+            for rowid, length in self.connection.execute(OLDEST, (EVICT_CHUNK,)).fetchall():
+                if total <= self.max_bytes:
+                    break
+                evicted.append((rowid,))
+                total -= length
+            if not evicted:
+                break
+            self.connection.executemany("DELETE FROM palettes WHERE rowid = ?", evicted)
+
+    def take_unplayed(self, size: int, strategy: str) -> Optional[tuple[int, np.ndarray]]:
+        # The oldest palette no game has used yet, marked as played so the next game gets another
+        with self.lock, self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            row = self.connection.execute(
+                "SELECT rowid, seed, colors FROM palettes "
+                "WHERE size = ? AND strategy = ? AND played = 0 "
+                "ORDER BY last_used, rowid LIMIT 1",
+                (size, strategy),
+            ).fetchone()
+            if row is None:
+                return None
+            rowid, seed, colors = row
+            self.connection.execute(
+                "UPDATE palettes SET played = 1, last_used = ? WHERE rowid = ?",
+                (time.time_ns(), rowid),
+            )
+        return seed, self.to_array(size, colors)
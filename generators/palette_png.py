@@ -0,0 +1,47 @@
+import struct
+import zlib
+from typing import Callable, Optional
+
+# Called with (rows of cells written, total rows of cells)
+ProgressCallback = Callable[[int, int], None]
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# 8 bits per channel, truecolor (RGB), default compression/filter, no interlacing
+BIT_DEPTH = 8
+COLOR_TYPE_RGB = 2
+
+
+def write_chunk(file, tag: bytes, data: bytes):
+    file.write(struct.pack(">I", len(data)))
+    file.write(tag)
+    file.write(data)
+    file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(tag))))
+
+
+def write_palette_png(
+    colors: list[list[str]],
+    filename: str,
+    cell_size: int = 200,
+    progress: Optional[ProgressCallback] = None,
+):
+    # Stream the upscaled palette to a PNG one band of cells at a time. Only one scanline exists
+    # in memory at once, so peak memory is O(N * cell_size) instead of O(output area)
+    assert cell_size > 0, "The cell size must be at least 1 pixel"
+    height = len(colors) * cell_size
+    width = len(colors[0]) * cell_size
+    compressor = zlib.compressobj(1)
+    with open(filename, "wb") as file:
+        file.write(PNG_SIGNATURE)
+        header = struct.pack(">IIBBBBB", width, height, BIT_DEPTH, COLOR_TYPE_RGB, 0, 0, 0)
+        write_chunk(file, b"IHDR", header)
+        for row_index, row in enumerate(colors):
+            # Filter type 0 (none), then every cell's '#rrggbb' bytes repeated across its width
+            scanline = b"\x00" + b"".join(bytes.fromhex(color[1:]) * cell_size for color in row)
+            for _ in range(cell_size):
+                data = compressor.compress(scanline)
+                if data:
+                    write_chunk(file, b"IDAT", data)
+            if progress:
+                progress(row_index + 1, len(colors))
+        write_chunk(file, b"IDAT", compressor.flush())
+        write_chunk(file, b"IEND", b"")
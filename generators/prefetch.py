@@ -0,0 +1,68 @@
+import queue
+import threading
+from typing import Iterable, Optional
+from generators.color_logic import Board
+from generators.hsl_color_generator import DEFAULT_STRATEGY
+from generators.palette_cache import PaletteCache
+
+# Board size the size dialog falls back to, so it is worth having ready before the first game
+DEFAULT_BOARD_SIZE = 5
+
+
+class BoardPrefetcher:
+    def __init__(
+        self,
+        sizes: Iterable[int] = (DEFAULT_BOARD_SIZE,),
+        depth: int = 1,
+        cache: Optional[PaletteCache] = None,
+    ):
+        # Keep up to `depth` ready-made boards for every size that has been asked for. Boards are
+        # generated (or read from the palette cache) on a daemon worker thread while the GUI
+        # thread waits for the player
+        self.depth = depth
+        self.cache = cache
+        # Keyed by (size, corner strategy)
+        self.ready: dict[tuple[int, str], queue.Queue[Board]] = {}
+        self.pending: dict[tuple[int, str], int] = {}
+        self.lock = threading.Lock()
+        self.requests: queue.Queue[tuple[int, str]] = queue.Queue()
+        self.worker = threading.Thread(target=self.run, name="board-prefetch", daemon=True)
+        self.worker.start()
+        for size in sizes:
+            self.prefetch(size)
+
+    def prefetch(self, size: int, strategy: str = DEFAULT_STRATEGY):
+        key = (size, strategy)
+        with self.lock:
+            ready = self.ready.setdefault(key, queue.Queue())
+            missing = self.depth - ready.qsize() - self.pending.get(key, 0)
+            self.pending[key] = self.pending.get(key, 0) + max(missing, 0)
+        for _ in range(missing):
+            self.requests.put(key)
+
+    def run(self):
+        while True:
+            key = self.requests.get()
+            size, strategy = key
+            board = None
+            try:
+                board = Board(size, cache=self.cache, strategy=strategy)
+            except Exception:
+                # Invalid sizes or a busy or full cache: the synchronous fallback in get() raises
+                # the error where it can be reported, and this thread keeps serving other sizes
+                pass
+            finally:
+                with self.lock:
+                    self.pending[key] -= 1
+                    if board:
+                        self.ready[key].put(board)
+
+    def get(self, size: int, strategy: str = DEFAULT_STRATEGY) -> Board:
+        # Take a prefetched board, or generate one right away if none is ready yet.
+        # Either way, queue up the next board of this size for the following game
+        try:
+            board = self.ready[(size, strategy)].get_nowait()
+        except (KeyError, queue.Empty):
+            board = Board(size, cache=self.cache, strategy=strategy)
+        self.prefetch(size, strategy)
+        return board
@@ -0,0 +1,150 @@
+import os
+import struct
+import sys
+from array import array
+from typing import Optional, TYPE_CHECKING
+if TYPE_CHECKING:
+    from main import QBoard
+from generators.color_logic import Board, ColorLogic
+from generators.colors import default_lookup_table_dir
+from generators.hsl_color_generator import CORNER_STRATEGIES
+from generators.palette_cache import PaletteCache
+
+# A saved game is a checkpoint followed by an append-only journal, all little-endian:
+#   header    magic, version, flags, size, strategy, seed, moves, optimal moves, palette length
+#   palette   only without FLAG_SEEDED: palette RGB bytes, then the solution as uint16 indices
+#   board     the current board as uint16 palette indices, row-major
+#   journal   one (uint16, uint16) pair of swapped positions per move since the checkpoint
+# Autosave appends 4 bytes per swap; the whole file is only rewritten at a checkpoint
+MAGIC = b"CLRG"
+VERSION = 1
+# The palette is regenerated from (size, strategy, seed) instead of being stored
+FLAG_SEEDED = 1
+HEADER = struct.Struct("<4sBBH16sQIII")
+SWAP = struct.Struct("<HH")
+AUTOSAVE_FILENAME = "autosave.colors"
+
+
+def default_autosave_path() -> str:
+    return os.path.join(default_lookup_table_dir(), AUTOSAVE_FILENAME)
+
+
+def to_little_endian(cells: array) -> bytes:
+    if sys.byteorder == "big":
+        cells = array("H", cells)
+        cells.byteswap()
+    return cells.tobytes()
+
+
+def from_little_endian(data: bytes) -> array:
+    cells = array("H", data)
+    if sys.byteorder == "big":
+        cells.byteswap()
+    return cells
+
+
+class GameJournal:
+    def __init__(self, path: str):
+        self.path = path
+        self.file = None
+
+    def save(self, logic: ColorLogic):
+        # Write a full checkpoint of the game and start an empty journal after it
+        board = logic.color_board
+        seeded = board.from_seed
+        header = HEADER.pack(
+            MAGIC,
+            VERSION,
+            FLAG_SEEDED if seeded else 0,
+            board.size,
+            board.strategy.encode(),
+            board.seed if seeded else 0,
+            logic.total_moves,
+            logic.optimal_moves,
+            0 if seeded else len(board.palette),
+        )
+        parts = [header]
+        if not seeded:
+            parts += [bytes(board.palette_rgb), to_little_endian(board.solution_cells)]
+        parts.append(to_little_endian(board.board_cells))
+        self.close()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as file:
+            file.write(b"".join(parts))
+        os.replace(temp_path, self.path)
+        # Unbuffered, so every swap reaches the file as soon as it is made
+        self.file = open(self.path, "ab", buffering=0)
+
+    def record_swap(self, first: int, second: int):
+        if self.file:
+            self.file.write(SWAP.pack(first, second))
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def discard(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def load_game(path: str, ui: "QBoard", cache: Optional[PaletteCache] = None) -> ColorLogic:
+    # Rebuild a game from its checkpoint, then replay the journal on top of it
+    with open(path, "rb") as file:
+        data = file.read()
+    if len(data) < HEADER.size:
+        raise ValueError(f"{path} is not a saved game")
+    magic, version, flags, size, strategy, seed, moves, optimal, colors = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a saved game")
+    if size <= 2:
+        raise ValueError(f"{path} has an invalid board size {size}")
+    cells = size * size
+    offset = HEADER.size
+    # Check the length before building a board, so a corrupt size can't start a huge generation
+    stored = 2 * cells if flags & FLAG_SEEDED else 3 * colors + 4 * cells
+    if len(data) < offset + stored:
+        raise ValueError(f"{path} is truncated")
+    if flags & FLAG_SEEDED:
+        name = strategy.rstrip(b"\0").decode()
+        if name not in CORNER_STRATEGIES:
+            raise ValueError(f"{path} uses an unknown corner strategy {name!r}")
+        board = Board(size, seed=seed, cache=cache, shuffle=False, strategy=name)
+        board_cells = from_little_endian(data[offset:offset + 2 * cells])
+        if max(board_cells) >= len(board.palette):
+            raise ValueError(f"{path} has a color outside the palette")
+    else:
+        palette = [data[index:index + 3].hex() for index in range(offset, offset + 3 * colors, 3)]
+        palette = ["#" + color for color in palette]
+        offset += 3 * colors
+        solution = from_little_endian(data[offset:offset + 2 * cells])
+        offset += 2 * cells
+        saved = from_little_endian(data[offset:offset + 2 * cells])
+        if max(max(solution), max(saved)) >= colors:
+            raise ValueError(f"{path} has a color outside the palette")
+        grid = [
+            [palette[index] for index in solution[row:row + size]]
+            for row in range(0, cells, size)
+        ]
+        board = Board(size, solution=grid, shuffle=False)
+        # The saved palette may hold colors that are not in the solution; map every saved index
+        # onto the rebuilt board's palette
+        mapping = [board.palette_index(color) for color in palette]
+        board_cells = array("H", [mapping[index] for index in saved])
+    offset += 2 * cells
+    # A crash in the middle of an append can leave half a record at the end; ignore it
+    journal = data[offset:]
+    journal = journal[:len(journal) - len(journal) % SWAP.size]
+    for first, second in SWAP.iter_unpack(journal):
+        if first >= cells or second >= cells:
+            raise ValueError(f"{path} has a move outside the board")
+        board_cells[first], board_cells[second] = board_cells[second], board_cells[first]
+    # Swaps only rearrange colors: a board that isn't a permutation of the solution can't be won
+    if sorted(board_cells) != sorted(board.solution_cells):
+        raise ValueError(f"{path} doesn't hold the colors of its solution")
+    board.restore(board_cells)
+    moves += len(journal) // SWAP.size
+    return ColorLogic(size, ui, board=board, total_moves=moves, optimal_moves=optimal)
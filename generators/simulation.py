@@ -0,0 +1,167 @@
+import argparse
+import contextlib
+import io
+import statistics
+import time
+import tracemalloc
+from dataclasses import dataclass
+from random import sample
+from typing import Callable, Optional
+from generators.color_logic import Board, ColorLogic, Coordinates
+from generators.colors import rgb_array_to_hex
+from generators.hsl_color_generator import ColorGenerator
+
+
+class HeadlessUI:
+    # Stands in for QBoard: ColorLogic only ever calls these four methods on its ui
+    def __init__(self):
+        self.wins = 0
+        self.last_score: Optional[tuple[int, Optional[int]]] = None
+
+    def select_button(self, coords: Coordinates):
+        pass
+
+    def reset_selection(self, coords: Coordinates):
+        pass
+
+    def highlight_button(self, coords: Coordinates, color: str):
+        pass
+
+    def show_win(self, moves: Optional[int], optimal: Optional[int] = None, exact: bool = True):
+        self.wins += 1
+        self.last_score = (moves, optimal)
+
+
+# A player looks at the game and returns the two cells to swap next
+Player = Callable[[ColorLogic], tuple[Coordinates, Coordinates]]
+
+
+def random_player(logic: ColorLogic) -> tuple[Coordinates, Coordinates]:
+    # Swap two misplaced cells at random. Slow to finish, but never undoes a correct cell
+    board = logic.color_board
+    misplaced = board.misplaced_positions()
+    if len(misplaced) < 2:
+        return greedy_player(logic)
+    first, second = sample(misplaced, 2)
+    return board.coordinates(first), board.coordinates(second)
+
+
+def greedy_player(logic: ColorLogic) -> tuple[Coordinates, Coordinates]:
+    # Follow the hints: every move puts at least one color in place
+    hint = logic.color_board.hint()
+    assert hint, "The game is already solved"
+    return hint
+
+
+def optimal_player(logic: ColorLogic) -> tuple[Coordinates, Coordinates]:
+    # Replays the solver's swap sequence, computed once per game
+    plan = getattr(logic, "simulation_plan", None)
+    if plan is None:
+        plan = logic.simulation_plan = list(reversed(logic.color_board.solve()))
+    return plan.pop()
+
+
+PLAYERS: dict[str, Player] = {
+    "random": random_player,
+    "greedy": greedy_player,
+    "optimal": optimal_player,
+}
+
+
+@dataclass
+class SimulationReport:
+    player: str
+    size: int
+    games: int
+    completed: int
+    moves: int
+    seconds: float
+    move_latency_us: list[float]
+    peak_memory: Optional[int] = None
+
+    @property
+    def games_per_second(self) -> float:
+        return self.games / self.seconds if self.seconds else 0.0
+
+    @property
+    def moves_per_second(self) -> float:
+        return self.moves / self.seconds if self.seconds else 0.0
+
+    def latency_percentile(self, pct: int) -> float:
+        if len(self.move_latency_us) < 2:
+            return self.move_latency_us[0] if self.move_latency_us else 0.0
+        return statistics.quantiles(self.move_latency_us, n=100, method="inclusive")[pct - 1]
+
+    def summary(self) -> str:
+        memory = f", peak memory {self.peak_memory / 1024:.0f} KiB" if self.peak_memory else ""
+        return (
+            f"{self.player:>7} size {self.size:>2}: {self.completed}/{self.games} games solved, "
+            f"{self.games_per_second:.0f} games/s, {self.moves_per_second:.0f} moves/s, "
+            f"move latency p50 {self.latency_percentile(50):.1f} us, "
+            f"p95 {self.latency_percentile(95):.1f} us, p99 {self.latency_percentile(99):.1f} us"
+            f"{memory}"
+        )
+
+
+def play_game(
+    logic: ColorLogic, player: Player, latencies: list[float], max_moves: int
+) -> bool:
+    # Each move is a select and a swap, exactly like two clicks in the GUI
+    while not logic.completed and logic.total_moves < max_moves:
+        first, second = player(logic)
+        start = time.perf_counter_ns()
+        logic.select_and_swap(first)
+        logic.select_and_swap(second)
+        latencies.append((time.perf_counter_ns() - start) / 1000)
+    return logic.completed
+
+
+def simulate(
+    player_name: str,
+    size: int,
+    games: int,
+    max_moves: Optional[int] = None,
+    measure_memory: bool = False,
+) -> SimulationReport:
+    player = PLAYERS[player_name]
+    # Random players can wander for a long time on big boards, so cap every game
+    max_moves = max_moves or 20 * size * size
+    latencies: list[float] = []
+    completed = moves = 0
+    # Palettes and shuffled boards are made up front, so the timings cover only the logic layer:
+    # setting up each game (solver included) and playing it
+    palettes = rgb_array_to_hex(ColorGenerator(size).generate_boards(size, games))
+    boards = [Board(size, solution=palette) for palette in palettes]
+    if measure_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    # ColorLogic prints a message on every win
+    with contextlib.redirect_stdout(io.StringIO()):
+        for board in boards:
+            logic = ColorLogic(size, HeadlessUI(), board=board)
+            completed += play_game(logic, player, latencies, max_moves)
+            moves += logic.total_moves
+    seconds = time.perf_counter() - start
+    peak_memory = None
+    if measure_memory:
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return SimulationReport(
+        player_name, size, games, completed, moves, seconds, latencies, peak_memory
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play games headlessly and measure the logic")
+    parser.add_argument("--players", nargs="+", choices=list(PLAYERS), default=list(PLAYERS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[3, 5, 10, 25])
+    parser.add_argument("--games", type=int, default=1000, help="games per player and size")
+    parser.add_argument("--max-moves", type=int, help="give up on a game after this many moves")
+    parser.add_argument(
+        "--memory", action="store_true", help="track peak memory (slows the run down)"
+    )
+    args = parser.parse_args()
+    for size in args.sizes:
+        for name in args.players:
+            report = simulate(name, size, args.games, args.max_moves, args.memory)
+            print(report.summary())
@@ -0,0 +1,69 @@
+from dataclasses import dataclass
+from typing import Iterable, Sequence
+
+# Boards are flat row-major sequences of palette indices (see Board.board_cells). Nothing here
+# needs Qt or a Board, so recorded games can be graded offline
+
+
+def target_positions(board: Sequence[int], solution: Sequence[int]) -> list[int]:
+    # For every position, the position its current color should move to. Cells that are already
+    # right stay put; repeated colors are matched to their free solution spots in order
+    targets = list(range(len(board)))
+    free_spots: dict[int, list[int]] = {}
+    for position, (cell, solution_cell) in enumerate(zip(board, solution)):
+        if cell != solution_cell:
+            free_spots.setdefault(solution_cell, []).append(position)
+    for position, (cell, solution_cell) in enumerate(zip(board, solution)):
+        if cell != solution_cell:
+            targets[position] = free_spots[cell].pop()
+    return targets
+
+
+def min_swaps(board: Sequence[int], solution: Sequence[int]) -> int:
+    # Every cycle of length k in the permutation takes k - 1 swaps. Exact when every color is
+    # distinct; with repeated colors it is the cost of the matching above, an upper bound
+    targets = target_positions(board, solution)
+    seen = bytearray(len(targets))
+    swaps = 0
+    for start in range(len(targets)):
+        length = 0
+        position = start
+        while not seen[position]:
+            seen[position] = 1
+            position = targets[position]
+            length += 1
+        swaps += max(length - 1, 0)
+    return swaps
+
+
+def optimal_swaps(board: Sequence[int], solution: Sequence[int]) -> list[tuple[int, int]]:
+    # A shortest sequence of swaps (pairs of positions) that turns board into solution. Each
+    # swap puts at least one color in its final place
+    targets = target_positions(board, solution)
+    swaps = []
+    for position in range(len(targets)):
+        while targets[position] != position:
+            target = targets[position]
+            swaps.append((position, target))
+            targets[position], targets[target] = targets[target], target
+    return swaps
+
+
+@dataclass
+class Grade:
+    moves: int
+    optimal: int
+
+    @property
+    def extra_moves(self) -> int:
+        return self.moves - self.optimal
+
+    @property
+    def efficiency(self) -> float:
+        # 1.0 for a perfect game
+        return self.optimal / self.moves if self.moves else 1.0
+
+
+def grade_games(games: Iterable[tuple[Sequence[int], Sequence[int], int]]) -> list[Grade]:
+    # games: (starting board, solution, moves the player took)
+    return [Grade(moves, min_swaps(board, solution)) for board, solution, moves in games]
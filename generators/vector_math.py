@@ -1,6 +1,7 @@
 import math
-from random import randint
-from typing import Any
+import random
+from typing import Any, Optional
+import numpy as np
 
 
 class Vector():
@@ -22,18 +23,34 @@ def coords_from_circle(center: tuple[int, int], radius: int, angle: float) -> tu
     return x, y
 
 
-def points_on_a_circle(center: tuple[int, int], radius: int):
-    corners = []
-    random_angle_degrees = randint(0, 360)
-    wiggle_room = range(-3, 3)
-    # We don't want the points to be exactly aligned with either axis, as that would mean a very
-    # similar color in multiple corners, differentiated by lightness. Add some finger-in-the-air
-    # "wiggle room" where the angle is not allowed to be in. The wiggle room is around the 45
-    # degree mark for perfectly aligned squares, and the 90 degree mark for perfect rhombuses.
+# We don't want the points to be exactly aligned with either axis, as that would mean a very
+# similar color in multiple corners, differentiated by lightness. Add some finger-in-the-air
+# "wiggle room" where the angle is not allowed to be in. The wiggle room is around the 45
+# degree mark for perfectly aligned squares, and the 90 degree mark for perfect rhombuses.
+# Every multiple of 90 is a multiple of 45, so one band of 0-2 degrees past each 45 covers both.
+# Precomputing the allowed angles means one draw per circle instead of redrawing until one fits
+WIGGLE_ROOM = 3
+ALLOWED_ANGLES = tuple(angle for angle in range(0, 361) if angle % 45 >= WIGGLE_ROOM)
+ALLOWED_ANGLES_ARRAY = np.array(ALLOWED_ANGLES)
+# Create points at different corners
+CORNER_DELTAS = (0, 90, 270, 180)
+
+
+def points_on_a_circle(center: tuple[int, int], radius: int, rng: Optional[random.Random] = None):
     # Calculate a random angle to ensure different color locations in the final gradient
-    while random_angle_degrees % 45 in wiggle_room or random_angle_degrees % 90 in wiggle_room:
-        random_angle_degrees = randint(0, 360)
-    # Create points at different corners
-    for delta in [0, 90, 270, 180]:
-        corners.append(coords_from_circle(center, radius, random_angle_degrees + delta))
-    return corners
+    random_angle_degrees = (rng or random).choice(ALLOWED_ANGLES)
+    return [
+        coords_from_circle(center, radius, random_angle_degrees + delta) for delta in CORNER_DELTAS
+    ]
+
+
+def points_on_circles(
+    centers: np.ndarray, radii: np.ndarray, rng: np.random.Generator
+) -> np.ndarray:
+    # Corners for many circles at once: (n, 2) centres and (n,) radii -> (n, 4, 2) rounded
+    # corners in the same order and with the same allowed angles as points_on_a_circle
+    angles = rng.choice(ALLOWED_ANGLES_ARRAY, size=len(radii))
+    radians = np.radians(angles[:, np.newaxis] + np.array(CORNER_DELTAS))
+    x = np.rint(radii[:, np.newaxis] * np.cos(radians) + centers[:, 0, np.newaxis])
+    y = np.rint(radii[:, np.newaxis] * np.sin(radians) + centers[:, 1, np.newaxis])
+    return np.stack([x, y], axis=-1).astype(np.int64)
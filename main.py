@@ -1,14 +1,22 @@
 import PyQt6.QtCore as qcore
 import PyQt6.QtWidgets as qwidget
 import PyQt6.QtGui as qgui
+import sqlite3
 import sys
-from functools import partial
+import threading
+from functools import lru_cache, partial
 from typing import Optional, Callable
 from math import floor
 from random import randint
 import os
 
 from generators.color_logic import ColorLogic, Coordinates, PinnedPoints
+from generators.colors import enable_lookup_table
+from generators.hsl_color_generator import DEFAULT_STRATEGY, playable_strategies
+from generators.palette_cache import PaletteCache
+from generators.palette_png import ProgressCallback
+from generators.savegame import GameJournal, default_autosave_path, load_game
+from generators.prefetch import BoardPrefetcher
 
 DEFAULT_WINDOW_SIZE = 500
 RED = "#ff0000"
@@ -16,12 +24,60 @@ GREEN = "#22ff00"
 BLACK = "black"
 WHITE = "white"
 TITLE = "Väriaine"
+# Colors and stylesheets remembered by the style caches, enough for several 99x99 palettes
+STYLE_CACHE_SIZE = 1 << 15
+# Boards at least this wide are painted by a single ColorGrid instead of a grid of ColorButtons
+PAINTED_GRID_MIN_SIZE = 20
 
 BASEDIR = os.path.dirname(__file__)
 
+
+def cell_edge(index: int, length: int, cells: int) -> int:
+    # Integer edges of a grid of `cells` cells over `length` pixels, so neighbouring cells share
+    # them without gaps. Cell i covers pixels [cell_edge(i), cell_edge(i + 1))
+    return index * length // cells
+
+
+def cell_index(pixel: int, length: int, cells: int) -> int:
+    # The cell whose [cell_edge(i), cell_edge(i + 1)) range holds the pixel
+    return ((pixel + 1) * cells + length - 1) // length - 1
+
+
 # camelCase methods are inherited from PyQt6; snake_case methods are specific to the implementation
 
 
+# Everything derived from a color is computed once per palette color, and every distinct
+# stylesheet string is built once and shared, instead of per button and per update
+
+
+@lru_cache(maxsize=STYLE_CACHE_SIZE)
+def contrast_color(color: str) -> str:
+    qcolor = qgui.QColor(color)
+    brightness = (0.299 * qcolor.red() + 0.587 * qcolor.green() + 0.114 * qcolor.blue()) / 255
+    return BLACK if brightness > 0.5 else WHITE
+
+
+@lru_cache(maxsize=STYLE_CACHE_SIZE)
+def darker_shade(color: str) -> str:
+    return qgui.QColor(color).darker(110).name()  # When clicked, button 10% darker
+
+
+@lru_cache(maxsize=STYLE_CACHE_SIZE)
+def button_style(bg: str, fg: str, border: str) -> str:
+    return f"""
+            QPushButton {{
+                background-color: {bg};
+                color: {fg};
+                border: {border};
+            }}
+            QPushButton:checked {{
+                background-color: {darker_shade(bg)};
+                color: {fg};
+                border: 2px solid {contrast_color(bg)};
+            }}
+        """
+
+
 class ColorButton(qwidget.QPushButton):
 
     def __init__(
@@ -42,12 +98,15 @@ class ColorButton(qwidget.QPushButton):
         policy = qwidget.QSizePolicy.Policy.Minimum
         self.setSizePolicy(qwidget.QSizePolicy(policy, policy))
         self.fg = self.contrast_color(color)
-        self.set_color(color)
+        self.style_sheet: Optional[str] = None
+        self.bg = color
+        self.border = f"2px solid {color}"
+        self.apply_style()
         self.setAcceptDrops(self.parent_board.acceptDrops())
 
     def set_color(self, color: str):
         self.bg = color
-        self.set_border(color)
+        self.border = f"2px solid {color}"
         self.update_style()
 
     def set_border(self, border: str):
@@ -55,26 +114,18 @@ class ColorButton(qwidget.QPushButton):
         self.update_style()
 
     def contrast_color(self, color: str) -> str:
-        r, g, b = qgui.QColor(color).red(), qgui.QColor(color).green(), qgui.QColor(color).blue()
-        brightness = (0.299 * r + 0.587 * g + 0.114 * b) / 255
-        return BLACK if brightness > 0.5 else WHITE
+        return contrast_color(color)
 
     def update_style(self):
-        darker_shade = qgui.QColor(self.bg).darker(110).name()  # When clicked, button 10% darker
-        contrast_border = self.contrast_color(self.bg)
-        style = f"""
-            QPushButton {{
-                background-color: {self.bg};
-                color: {self.fg};
-                border: {self.border};
-            }}
-            QPushButton:checked {{
-                background-color: {darker_shade};
-                color: {self.fg};
-                border: 2px solid {contrast_border};
-            }}
-        """
-        self.setStyleSheet(style)
+        # Coalesced by the board: several changes in one event-loop iteration restyle once
+        self.parent_board.schedule_restyle(self)
+
+    def apply_style(self):
+        style = button_style(self.bg, self.fg, self.border)
+        # Qt re-parses the stylesheet on every setStyleSheet, so skip it when nothing changed
+        if style is not self.style_sheet:
+            self.style_sheet = style
+            self.setStyleSheet(style)
 
     def disable(self):
         img = qgui.QPixmap(os.path.join(BASEDIR, "images", "dot.png"))
@@ -84,7 +135,7 @@ class ColorButton(qwidget.QPushButton):
 
     # Drag and drop events
     def select_and_swap(self, coords: Coordinates, e: Optional[qgui.QMouseEvent]) -> None:
-        self.setChecked(True)
+        self.parent_board.select_button(coords)
         self.parent_board.logic.select_and_swap(coords)
 
     def mouseMoveEvent(self, e: qgui.QMouseEvent):
@@ -112,6 +163,177 @@ class ColorButton(qwidget.QPushButton):
         e.accept()
 
 
+class ColorGrid(qwidget.QWidget):
+    # Paints the whole board in one widget, for boards too big for one ColorButton per cell.
+    # Clicks and drag and drop are hit-tested here, and only the cells that change are repainted
+
+    def __init__(self, parent: "QBoard", size: int, window_height: int):
+        super(ColorGrid, self).__init__()
+        self.parent_board = parent
+        self.board_size = size
+        self.load_colors()
+        self.dot = qgui.QPixmap(os.path.join(BASEDIR, "images", "dot.png"))
+        cell_size = floor(window_height / size)
+        self.setMinimumSize(qcore.QSize(cell_size * size, cell_size * size))
+        policy = qwidget.QSizePolicy.Policy.Minimum
+        self.setSizePolicy(qwidget.QSizePolicy(policy, policy))
+        self.setAcceptDrops(self.parent_board.acceptDrops())
+
+    def load_colors(self):
+        # Take the colors of the current game and drop all decorations
+        board = self.parent_board.logic.color_board
+        self.colors = [
+            [board.get_cell(Coordinates(row, col)) for col in range(self.board_size)]
+            for row in range(self.board_size)
+        ]
+        # Non-default decorations: hint borders and checked (selected) cells
+        self.borders: dict[tuple[int, int], str] = {}
+        self.checked: set[tuple[int, int]] = set()
+        self.update()
+
+    def cell_rect(self, row: int, col: int) -> qcore.QRect:
+        width, height, size = self.width(), self.height(), self.board_size
+        left, right = cell_edge(col, width, size), cell_edge(col + 1, width, size)
+        top, bottom = cell_edge(row, height, size), cell_edge(row + 1, height, size)
+        return qcore.QRect(left, top, right - left, bottom - top)
+
+    def cell_at(self, pos: qcore.QPoint) -> Optional[Coordinates]:
+        if not self.rect().contains(pos):
+            return None
+        row = cell_index(pos.y(), self.height(), self.board_size)
+        col = cell_index(pos.x(), self.width(), self.board_size)
+        return Coordinates(row, col)
+
+    def playable_cell_at(self, pos: qcore.QPoint) -> Optional[Coordinates]:
+        coords = self.cell_at(pos)
+        if coords and not self.parent_board.pinned_points.has(coords):
+            return coords
+        return None
+
+    def repaint_cell(self, coords: Coordinates):
+        self.update(self.cell_rect(coords.row, coords.col))
+
+    def set_color(self, coords: Coordinates, color: str):
+        self.colors[coords.row][coords.col] = color
+        self.borders.pop((coords.row, coords.col), None)
+        self.repaint_cell(coords)
+
+    def set_checked(self, coords: Coordinates, checked: bool):
+        if checked:
+            self.checked.add((coords.row, coords.col))
+        else:
+            self.checked.discard((coords.row, coords.col))
+        self.repaint_cell(coords)
+
+    def set_border(self, coords: Coordinates, border: str):
+        self.borders[(coords.row, coords.col)] = border
+        self.repaint_cell(coords)
+
+    def reset_borders(self):
+        borders, self.borders = self.borders, {}
+        for row, col in borders:
+            self.repaint_cell(Coordinates(row, col))
+
+    def paint_cell(self, painter: qgui.QPainter, row: int, col: int):
+        rect = self.cell_rect(row, col)
+        border = self.borders.get((row, col))
+        if (row, col) in self.checked:
+            # Same look as a checked ColorButton: 10% darker with a contrasting border
+            painter.fillRect(rect, qgui.QColor(darker_shade(self.colors[row][col])))
+            border = contrast_color(self.colors[row][col])
+        else:
+            painter.fillRect(rect, qgui.QColor(self.colors[row][col]))
+        if border:
+            painter.setPen(qgui.QPen(qgui.QColor(border), 2))
+            painter.drawRect(rect.adjusted(1, 1, -1, -1))
+        if self.parent_board.pinned_points.has(Coordinates(row, col)):
+            dot = self.dot.scaled(
+                rect.size(),
+                qcore.Qt.AspectRatioMode.KeepAspectRatio,
+                qcore.Qt.TransformationMode.SmoothTransformation,
+            )
+            painter.drawPixmap(
+                rect.x() + (rect.width() - dot.width()) // 2,
+                rect.y() + (rect.height() - dot.height()) // 2,
+                dot,
+            )
+
+    def paintEvent(self, e: qgui.QPaintEvent):
+        # Only the cells overlapping the dirty area are painted
+        dirty = e.rect()
+        first = self.cell_at(dirty.topLeft()) or Coordinates(0, 0)
+        end = self.board_size - 1
+        last = self.cell_at(dirty.bottomRight()) or Coordinates(end, end)
+        painter = qgui.QPainter(self)
+        for row in range(first.row, last.row + 1):
+            for col in range(first.col, last.col + 1):
+                self.paint_cell(painter, row, col)
+        painter.end()
+
+    # Clicks and drag and drop events
+    def mousePressEvent(self, e: qgui.QMouseEvent):
+        coords = self.playable_cell_at(e.position().toPoint())
+        if coords:
+            self.drag_origin = coords
+            self.parent_board.logic.select_and_swap(coords)
+
+    def mouseMoveEvent(self, e: qgui.QMouseEvent):
+        # Only move when we're accepting drops - i.e. have drag and drop enabled
+        origin = getattr(self, "drag_origin", None)
+        if e.buttons() == qcore.Qt.MouseButton.LeftButton and self.acceptDrops() and origin:
+            self.drag_origin = None
+            rect = self.cell_rect(origin.row, origin.col)
+            drag = qgui.QDrag(self)
+            drag.setMimeData(qcore.QMimeData())
+            drag.setPixmap(self.grab(rect))
+            drag.setHotSpot(e.position().toPoint() - rect.topLeft())
+            drag.exec(qcore.Qt.DropAction.MoveAction)
+
+    def mouseReleaseEvent(self, e: qgui.QMouseEvent):
+        self.drag_origin = None
+
+    def dragEnterEvent(self, e):
+        e.accept()
+
+    def dragMoveEvent(self, e):
+        e.accept()
+
+    def dropEvent(self, e):
+        coords = self.playable_cell_at(e.position().toPoint())
+        if coords:
+            self.parent_board.logic.select_and_swap(coords)
+        e.accept()
+
+
+class ExportSignals(qcore.QObject):
+    # Lives on the GUI thread, so emitting from a worker delivers through queued connections.
+    # Every signal carries its ExportTask, since two exports may share a filename
+    progress = qcore.pyqtSignal(object, int)
+    finished = qcore.pyqtSignal(object)
+    failed = qcore.pyqtSignal(object, str)
+
+
+class ExportTask(qcore.QRunnable):
+    # One palette export, run on a worker thread and reporting back through signals
+    def __init__(self, filename: str, export: Callable[[ProgressCallback], None]):
+        super(ExportTask, self).__init__()
+        self.filename = filename
+        self.export = export
+        self.signals = ExportSignals()
+
+    def report_progress(self, done: int, total: int):
+        self.signals.progress.emit(self, done * 100 // total)
+
+    def run(self):
+        # Nothing may escape run(): PyQt aborts the process on an exception in a QRunnable
+        try:
+            self.export(self.report_progress)
+        except Exception as error:
+            self.signals.failed.emit(self, str(error))
+        else:
+            self.signals.finished.emit(self)
+
+
 class AskSize(qwidget.QDialog):
     def __init__(self, parent: "QBoard"):
         super().__init__(parent)
@@ -126,9 +348,16 @@ class AskSize(qwidget.QDialog):
         # Only ints, at most 2 digits
         self.input_number.setInputMask('00')
 
+        # How the palette's four corner colors are picked
+        self.strategy_choice = qwidget.QComboBox(self)
+        self.strategy_choice.addItems(playable_strategies())
+        self.strategy_choice.setCurrentText(DEFAULT_STRATEGY)
+
         layout = qwidget.QVBoxLayout()
         layout.addWidget(message)
         layout.addWidget(self.input_number)
+        layout.addWidget(qwidget.QLabel("Palette style"))
+        layout.addWidget(self.strategy_choice)
         self.setLayout(layout)
 
     def save_text(self):
@@ -137,14 +366,25 @@ class AskSize(qwidget.QDialog):
         if parent and isinstance(parent, QBoard):
             number = int(self.input_number.text()) if self.input_number.text() else 5
             parent.game_size = number
+            parent.game_strategy = self.strategy_choice.currentText()
         self.close()
 
 
 class QBoard(qwidget.QMainWindow):
-    def __init__(self, window_height: int, center: qcore.QPoint) -> None:
+    def __init__(
+        self,
+        window_height: int,
+        center: qcore.QPoint,
+        prefetcher: Optional[BoardPrefetcher] = None,
+        autosave_path: Optional[str] = None,
+    ) -> None:
         # Initialise and center the board
         super().__init__()
         self.center = center
+        self.prefetcher = prefetcher or BoardPrefetcher()
+        # Every game is journaled here as it is played, unless None
+        self.autosave_path = autosave_path
+        self.journal = GameJournal(autosave_path) if autosave_path else None
         self.window_height = window_height
         self.setAcceptDrops(True)
         self.set_title()
@@ -154,26 +394,107 @@ class QBoard(qwidget.QMainWindow):
         # icon = qgui.QPixmap("images/colors-icon.icns")
         self.setWindowIcon(qgui.QIcon(os.path.join(BASEDIR, "images", "colors-icon-rounded.icns")))
 
-        # Get the game size
+        # Built once and kept for every game played in this window
+        self.setup_toolbar()
+        self.setup_exports()
+        self.size_dialog = AskSize(self)
+        # Buttons waiting to be restyled at the end of this event-loop iteration
+        self.pending_restyle: set[ColorButton] = set()
+        self.button_grid: list[list[ColorButton]] = []
+        self.color_grid: Optional[ColorGrid] = None
+
+        # Pick up an unfinished game, or get the size of a new one
         self.game_size = 0
-        size_dialog = AskSize(self)
-        size_dialog.exec()
+        self.game_strategy = DEFAULT_STRATEGY
+        if not (self.has_saved_game() and self.ask_resume() and self.resume_game()):
+            self.ask_game_size()
+            self.setup_game()
 
-        self.setup_game()
+    def ask_game_size(self):
+        # Closing the dialog without an answer keeps the previous size
+        self.size_dialog.input_number.clear()
+        self.size_dialog.exec()
 
     def set_title(self):
         mode = " (Drag and drop)" if self.acceptDrops() else " (Click)"
         self.setWindowTitle(TITLE + mode)
         print(f"Drag and drop is now: {self.acceptDrops()}")
 
-    def setup_game(self):
-        self.logic = ColorLogic(self.game_size, self)
+    def setup_game(self, logic: Optional[ColorLogic] = None):
+        # A new game of the chosen size, or a resumed one
+        if logic is None:
+            board = self.prefetcher.get(self.game_size, self.game_strategy)
+            logic = ColorLogic(self.game_size, self, board=board)
+        self.logic = logic
+        self.game_size = logic.board_size
+        self.game_strategy = logic.color_board.strategy
+        self.start_autosave()
         self.pinned_points = PinnedPoints(self.game_size)
-        self.button_grid, self.button_holder = self.create_button_grid(self.game_size)
+        # Cells with a hint border or a checked state, so resetting them doesn't touch the rest
+        self.hinted_cells: set[tuple[int, int]] = set()
+        self.checked_cells: set[tuple[int, int]] = set()
+        if self.grid_size() == self.game_size:
+            # Same size as the last game: recolor the existing grid in place
+            self.recolor_grid()
+            return
+        if self.game_size >= PAINTED_GRID_MIN_SIZE:
+            self.button_grid = []
+            self.color_grid = ColorGrid(self, self.game_size, self.window_height)
+            self.button_holder: qwidget.QWidget = self.color_grid
+        else:
+            self.color_grid = None
+            self.button_grid, self.button_holder = self.create_button_grid(self.game_size)
+        # Any queued restyles belong to the old buttons, which Qt deletes with the old grid
+        self.pending_restyle.clear()
         self.setCentralWidget(self.button_holder)
-        self.setup_toolbar()
         self.setMinimumSize(self.sizeHint())
 
+    def start_autosave(self):
+        if not self.journal:
+            return
+        try:
+            self.journal.save(self.logic)
+            self.logic.journal = self.journal
+        except OSError as error:
+            self.statusBar().showMessage(f"Autosave unavailable: {error}", 5000)
+
+    def has_saved_game(self) -> bool:
+        return bool(self.autosave_path) and os.path.exists(self.autosave_path)
+
+    def ask_resume(self) -> bool:
+        answer = qwidget.QMessageBox.question(
+            self, "Resume?", "Would you like to continue your last unfinished game?"
+        )
+        return answer == qwidget.QMessageBox.StandardButton.Yes
+
+    def resume_game(self) -> bool:
+        if not self.autosave_path:
+            return False
+        try:
+            logic = load_game(self.autosave_path, self, self.prefetcher.cache)
+        except (OSError, ValueError) as error:
+            # Drop the unreadable save, or every launch would offer it again
+            self.journal.discard()
+            self.statusBar().showMessage(f"Could not resume the game: {error}", 5000)
+            return False
+        self.setup_game(logic)
+        return True
+
+    def grid_size(self) -> int:
+        if self.color_grid:
+            return self.color_grid.board_size
+        return len(self.button_grid)
+
+    def recolor_grid(self):
+        board = self.logic.color_board
+        if self.color_grid:
+            self.color_grid.load_colors()
+            return
+        for row in self.button_grid:
+            for button in row:
+                button.set_color(board.get_cell(button.coords))
+                button.setChecked(False)
+
     def setup_toolbar(self):
         toolbar = qwidget.QToolBar("Tools")
         self.addToolBar(toolbar)
@@ -215,6 +536,47 @@ class QBoard(qwidget.QMainWindow):
             self.start_new,
         )
 
+    def setup_exports(self):
+        # A single worker keeps exports in the order they were requested, off the GUI thread
+        self.export_pool = qcore.QThreadPool(self)
+        self.export_pool.setMaxThreadCount(1)
+        # Queued and running exports; also keeps their signals alive until they finish
+        self.exports: list[ExportTask] = []
+        self.export_progress = qwidget.QProgressBar()
+        self.export_progress.setMaximumWidth(200)
+        self.statusBar().addPermanentWidget(self.export_progress)
+        self.export_progress.hide()
+
+    def start_export(self, filename: str, export: Callable[[ProgressCallback], None]):
+        task = ExportTask(filename, export)
+        task.signals.progress.connect(self.show_export_progress)
+        task.signals.finished.connect(self.finish_export)
+        task.signals.failed.connect(self.fail_export)
+        self.exports.append(task)
+        self.export_progress.show()
+        self.show_export_progress(self.exports[0], self.export_progress.value())
+        self.export_pool.start(task)
+
+    def show_export_progress(self, task: ExportTask, percent: int):
+        self.export_progress.setValue(percent)
+        queued = f" ({len(self.exports) - 1} more queued)" if len(self.exports) > 1 else ""
+        self.statusBar().showMessage(f"Saving {task.filename}...{queued}")
+
+    def end_export(self, task: ExportTask):
+        self.exports = [queued for queued in self.exports if queued is not task]
+        self.export_progress.setValue(0)
+        if not self.exports:
+            self.export_progress.hide()
+
+    def finish_export(self, task: ExportTask):
+        self.end_export(task)
+        self.statusBar().showMessage(f"Saved {task.filename}", 5000)
+        self.show_file_saved_msg(task.filename)
+
+    def fail_export(self, task: ExportTask, error: str):
+        self.end_export(task)
+        self.statusBar().showMessage(f"Could not save {task.filename}: {error}", 5000)
+
     def add_toolbar_action(self, bar: qwidget.QToolBar, title: str, hint: str, function: Callable):
         tool_button = qgui.QAction(title, self)
         tool_button.setToolTip(hint)
@@ -247,26 +609,65 @@ class QBoard(qwidget.QMainWindow):
         return buttons, button_holder
 
     def highlight_button(self, coords: Coordinates, color: str):
-        self.button_grid[coords.row][coords.col].set_color(color)
+        if self.color_grid:
+            self.color_grid.set_color(coords, color)
+        else:
+            self.button_grid[coords.row][coords.col].set_color(color)
+        # A new color replaces any hint border
+        self.hinted_cells.discard((coords.row, coords.col))
         self.reset_selection(coords)
 
     def select_button(self, coords: Coordinates):
-        self.button_grid[coords.row][coords.col].setChecked(True)
+        self.checked_cells.add((coords.row, coords.col))
+        if self.color_grid:
+            self.color_grid.set_checked(coords, True)
+        else:
+            self.button_grid[coords.row][coords.col].setChecked(True)
 
     def reset_selection(self, coords: Coordinates):
-        self.button_grid[coords.row][coords.col].setChecked(False)
+        if (coords.row, coords.col) not in self.checked_cells:
+            return
+        self.checked_cells.discard((coords.row, coords.col))
+        if self.color_grid:
+            self.color_grid.set_checked(coords, False)
+        else:
+            self.button_grid[coords.row][coords.col].setChecked(False)
+
+    def set_cell_border(self, coords: Coordinates, border: str):
+        self.hinted_cells.add((coords.row, coords.col))
+        if self.color_grid:
+            self.color_grid.set_border(coords, border)
+        else:
+            self.button_grid[coords.row][coords.col].set_border(border)
+
+    def schedule_restyle(self, button: ColorButton):
+        if not self.pending_restyle:
+            qcore.QTimer.singleShot(0, self.apply_pending_styles)
+        self.pending_restyle.add(button)
+
+    def apply_pending_styles(self):
+        pending, self.pending_restyle = self.pending_restyle, set()
+        for button in pending:
+            button.apply_style()
 
     def toggle_drag_and_drop(self):
+        if self.color_grid:
+            self.color_grid.setAcceptDrops(not self.color_grid.acceptDrops())
         for row in self.button_grid:
             for button in row:
                 button.setAcceptDrops(not button.acceptDrops())
         self.setAcceptDrops(not self.acceptDrops())
         self.set_title()
 
-    def show_win(self, moves: Optional[int]):
+    def show_win(self, moves: Optional[int], optimal: Optional[int] = None, exact: bool = True):
         win_msg = "You win!\n"
         if moves:
             win_msg += f"Total moves taken: {moves}.\n"
+            if optimal and exact:
+                win_msg += f"Fewest moves possible: {optimal}.\n"
+            elif optimal:
+                # Repeated colors: the solver's count may not be the true minimum
+                win_msg += f"Optimal moves (estimate): {optimal}.\n"
         win_msg += "Would you like to play a new game?"
         new_game = qwidget.QMessageBox.question(self, "You win!", win_msg)
 
@@ -275,25 +676,38 @@ class QBoard(qwidget.QMainWindow):
             self.start_new()
 
     def show_hint(self):
-        start_coords, where_to_go_coords = self.logic.color_board.hint()
-        self.button_grid[start_coords.row][start_coords.col].set_border(RED)
-        self.button_grid[where_to_go_coords.row][where_to_go_coords.col].set_border(GREEN)
+        hint = self.logic.color_board.hint()
+        if not hint:
+            qwidget.QMessageBox.information(self, "No hints", "Every color is already in place!")
+            return
+        start_coords, where_to_go_coords = hint
+        self.set_cell_border(start_coords, RED)
+        self.set_cell_border(where_to_go_coords, GREEN)
 
     def reset_hint(self):
-        for row in self.button_grid:
-            for btn in row:
+        # Only the cells show_hint decorated, not the whole grid
+        if self.color_grid:
+            self.color_grid.reset_borders()
+        else:
+            for row, col in self.hinted_cells:
+                btn = self.button_grid[row][col]
                 btn.set_border(btn.bg)
+        self.hinted_cells.clear()
 
     def start_new(self):
-        self.close()
-        self.__init__(self.window_height, self.center)
-        self.show()
+        # Keep the window, toolbar and dialog; only the game and, if the size changed, the grid
+        # are replaced
+        self.ask_game_size()
+        self.setup_game()
 
     def save_image_palette(self):
         generator = self.logic.color_board.generator
         full_path, filename = self.generate_filename("png")
-        generator.create_color_image(self.logic.solution, filename=full_path)
-        self.show_file_saved_msg(filename)
+        solution = self.logic.solution
+        self.start_export(
+            filename,
+            lambda progress: generator.stream_color_image(solution, full_path, progress=progress),
+        )
 
     def generate_filename(self, extension: str) -> tuple[str, str]:
         # Get home directory, save to wherever Downloads are
@@ -304,16 +718,23 @@ class QBoard(qwidget.QMainWindow):
 
     def save_colors_hex(self):
         full_path, filename = self.generate_filename("txt")
-        table = '\n'.join(['\t'.join([str(color) for color in row]) for row in self.logic.solution])
-        with open(full_path, "w") as file:
-            file.write(table)
-        self.show_file_saved_msg(filename)
+        solution = self.logic.solution
+
+        def export(progress: ProgressCallback):
+            table = '\n'.join(['\t'.join([str(color) for color in row]) for row in solution])
+            with open(full_path, "w") as file:
+                file.write(table)
+            progress(1, 1)
+
+        self.start_export(filename, export)
 
     def show_file_saved_msg(self, filename: str):
+        # Not modal, so a finished export doesn't interrupt the game
         saved_img_msg = qwidget.QMessageBox(self)
         saved_img_msg.setWindowTitle("Palette saved!")
         saved_img_msg.setText(f"The color palette was saved to Downloads as {filename}")
-        saved_img_msg.exec()
+        saved_img_msg.setAttribute(qcore.Qt.WidgetAttribute.WA_DeleteOnClose)
+        saved_img_msg.open()
 
 
 def get_app_height_center(app: qwidget.QApplication) -> tuple[int, qcore.QPoint]:
@@ -327,11 +748,28 @@ def get_app_height_center(app: qwidget.QApplication) -> tuple[int, qcore.QPoint]
     return window_height, center
 
 
+def load_lookup_table():
+    try:
+        enable_lookup_table()
+    except OSError as error:
+        print(f"Color lookup table unavailable, converting colors on the fly: {error}")
+
+
 if __name__ == "__main__":
     app = qwidget.QApplication(sys.argv)
+    # Shared, memory-mapped HSL -> RGB table, built on the very first run. That build takes a
+    # moment, so it happens on a worker thread; colors are converted on the fly until it is ready
+    threading.Thread(target=load_lookup_table, name="lookup-table", daemon=True).start()
+    cache: Optional[PaletteCache] = None
+    try:
+        # Palettes generated before, or filled offline by generators.batch --cache
+        cache = PaletteCache()
+    except (OSError, sqlite3.Error) as error:
+        print(f"Palette cache unavailable, generating every board: {error}")
     screen = app.primaryScreen()
     window_height, center = get_app_height_center(app)
 
-    window = QBoard(window_height, center)
+    # Start generating the default-size board while the size dialog is open
+    window = QBoard(window_height, center, BoardPrefetcher(cache=cache), default_autosave_path())
     window.show()
     app.exec()
@@ -1,8 +1,43 @@
+import contextlib
+import io
+import math
+import os
+import sqlite3
+import struct
+import time
+import tempfile
 import unittest.mock
 import main
 import unittest
-from generators.hsl_color_generator import ColorGenerator
-from generators.colors import HSL, RGB
+import numpy as np
+from random import randint
+from PIL import Image
+from generators.hsl_color_generator import (
+    CORNER_STRATEGIES,
+    DEFAULT_STRATEGY,
+    BatchStats,
+    ColorGenerator,
+    playable_strategies,
+)
+from generators.palette_cache import PaletteCache
+from generators.prefetch import BoardPrefetcher
+from generators.savegame import GameJournal, load_game
+from generators.simulation import PLAYERS, HeadlessUI, optimal_player, play_game, simulate
+from generators.solver import grade_games, min_swaps, optimal_swaps
+from generators.vector_math import points_on_circles
+from generators import batch, colors, distinctness, savegame
+from generators.color_logic import Board, Coordinates
+from generators.colors import HSL, RGB, hsl_array_to_rgb, rgb_array_to_hex
+
+
+def wait_until(condition, timeout: float = 10.0) -> bool:
+    # Poll a condition set by a background thread
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
 
 
 class Tests(unittest.TestCase):
@@ -133,3 +168,384 @@ class Tests(unittest.TestCase):
         rgb = RGB.from_hex(hex)
         new_hex = rgb.to_hex()
         assert new_hex == hex, f"{new_hex} is not the same as {hex}"
+
+    def test_board_array_matches_objects(self):
+        generator = ColorGenerator(self.size)
+        for size in [3, 7, 20, 99]:
+            corners = generator.generate_points_from_circle_smaller_range()
+            with self.subTest(params=size), unittest.mock.patch.object(
+                generator, "generate_corners", return_value=corners
+            ):
+                expected = [[hsl.to_hex() for hsl in row] for row in generator.generate_board(size)]
+                self.assertEqual(generator.generate_initial_color_board(size), expected)
+
+    def test_hsl_array_to_hex(self):
+        hsl = [[h, s, li] for h in range(0, 361, 7) for s in range(0, 101, 9) for li in range(101)]
+        hexes = rgb_array_to_hex(hsl_array_to_rgb(hsl))
+        self.assertEqual(hexes, [HSL(*color).to_hex() for color in hsl])
+
+    def test_color_image(self):
+        board = self.logic.solution
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "palette.png")
+            self.logic.color_board.generator.create_color_image(board, filename=filename)
+            with Image.open(filename) as image:
+                self.assertEqual(image.size, (self.size * 200, self.size * 200))
+                for row in range(self.size):
+                    for col in range(self.size):
+                        pixel = image.getpixel((col * 200 + 199, row * 200))
+                        self.assertEqual(pixel, RGB.from_hex(board[row][col]).as_tuple() + (255,))
+
+    def test_stream_color_image(self):
+        board = self.logic.solution
+        generator = self.logic.color_board.generator
+        with tempfile.TemporaryDirectory() as directory:
+            streamed = os.path.join(directory, "streamed.png")
+            rendered = os.path.join(directory, "rendered.png")
+            generator.stream_color_image(board, streamed, cell_size=7)
+            generator.create_color_image(board, filename=rendered, cell_size=7)
+            with Image.open(streamed) as image, Image.open(rendered) as expected:
+                self.assertEqual(image.size, (self.size * 7, self.size * 7))
+                self.assertEqual(image.tobytes(), expected.convert("RGB").tobytes())
+
+    def test_lookup_table(self):
+        hsl = [[h, s, li] for h in range(0, 361, 11) for s in range(0, 101, 7) for li in range(101)]
+        expected = [HSL(*color).to_hex() for color in hsl]
+        with tempfile.TemporaryDirectory() as directory:
+            try:
+                colors.enable_lookup_table(directory)
+                self.assertEqual([HSL(*color).to_hex() for color in hsl], expected)
+                self.assertEqual(rgb_array_to_hex(hsl_array_to_rgb(hsl)), expected)
+                # A second process maps the existing file instead of rebuilding it
+                table = colors.enable_lookup_table(directory)
+                self.assertEqual(table.hsl_to_hex(*hsl[-1]), expected[-1])
+            finally:
+                colors.disable_lookup_table()
+
+    def test_generate_boards(self):
+        generator = ColorGenerator(self.size)
+        # Compare boards with their corners, without distinctness redraws in between
+        generator.max_attempts = 1
+        corners = generator.generate_points_from_circle_smaller_range_batch(50)
+        self.assertTrue(generator.corners_in_bounds(corners).all())
+        self.assertTrue((corners[..., 1] > 20).all())
+        with unittest.mock.patch.object(generator.corner_strategy, "batch", return_value=corners):
+            boards = generator.generate_boards(6, 50)
+        self.assertEqual(boards.shape, (50, 6, 6, 3))
+        self.assertEqual(generator.last_batch_stats.boards, 50)
+        for board, corner in zip(boards, corners):
+            [tl, tr], [bl, br] = [[HSL(*color) for color in row] for row in corner.tolist()]
+            with unittest.mock.patch.object(
+                generator, "generate_corners", return_value=[[tl, tr], [bl, br]]
+            ):
+                self.assertEqual(rgb_array_to_hex(board), generator.generate_initial_color_board(6))
+
+    def test_prefetch(self):
+        prefetcher = BoardPrefetcher(sizes=[4], depth=2)
+        board = prefetcher.get(4)
+        self.assertEqual(board.size, 4)
+        logic = main.ColorLogic(4, unittest.mock.MagicMock(), board=board)
+        self.assertIs(logic.color_board, board)
+        # An unknown size is generated on the spot and prefetched from then on
+        self.assertEqual(prefetcher.get(6).size, 6)
+        self.assertIn((6, DEFAULT_STRATEGY), prefetcher.ready)
+        with self.assertRaises(AssertionError):
+            prefetcher.get(2)
+        # A failing cache doesn't stop the worker, and the size is prefetched again afterwards
+        cache = unittest.mock.MagicMock()
+        cache.take_unplayed.side_effect = [sqlite3.OperationalError("locked"), None, None]
+        prefetcher = BoardPrefetcher(sizes=[4], cache=cache)
+        self.assertTrue(wait_until(lambda: prefetcher.pending[(4, DEFAULT_STRATEGY)] == 0))
+        self.assertTrue(prefetcher.ready[(4, DEFAULT_STRATEGY)].empty())
+        prefetcher.prefetch(4)
+        self.assertTrue(wait_until(lambda: not prefetcher.ready[(4, DEFAULT_STRATEGY)].empty()))
+
+    def test_export_task(self):
+        def broken(progress):
+            progress(1, 2)
+            raise RuntimeError("broken")
+
+        # Any failure is reported through the task's own signal, never raised out of run()
+        task = main.ExportTask("palette.png", broken)
+        events = []
+        task.signals.progress.connect(lambda *args: events.append(("progress", *args)))
+        task.signals.failed.connect(lambda *args: events.append(("failed", *args)))
+        task.run()
+        self.assertEqual(events, [("progress", task, 50), ("failed", task, "broken")])
+
+    def test_circle_corners_in_bounds(self):
+        generator = ColorGenerator(self.size)
+        for _ in range(2000):
+            corners = generator.generate_points_from_circle_smaller_range()
+            self.assertTrue(all(corner.s > 20 for row in corners for corner in row))
+            generator.generate_points_from_circle_across_colors()
+
+    def test_points_on_circles(self):
+        centers = np.array([[180, 50], [100, 40]])
+        corners = points_on_circles(centers, np.array([30, 20]), np.random.default_rng())
+        self.assertEqual(corners.shape, (2, 4, 2))
+        for center, radius, points in zip(centers, [30, 20], corners.tolist()):
+            for x, y in points:
+                distance = math.dist((x, y), center)
+                self.assertLessEqual(abs(distance - radius), 1)
+
+    def test_misplaced_count(self):
+        board = self.logic.color_board
+        for _ in range(200):
+            first = main.Coordinates(randint(0, self.size - 1), randint(0, self.size - 1))
+            second = main.Coordinates(randint(0, self.size - 1), randint(0, self.size - 1))
+            board.swap(first, second)
+            self.assertEqual(board.misplaced, board.count_misplaced())
+            self.assertEqual(board.check_solved(), board.board == board.solution)
+        board.set_color(self.coords, '#000000')
+        self.assertEqual(board.misplaced, board.count_misplaced())
+        self.assertEqual(len(board.misplaced_positions()), board.misplaced)
+        # Generated and appended colors are both found again without growing the palette
+        for index, color in enumerate(list(board.palette)):
+            self.assertEqual(board.palette_index(color), index)
+
+    def test_hint_solves_board(self):
+        board = Board(8)
+        hint = board.hint()
+        while hint:
+            first, second = hint
+            self.assertNotEqual(board.get_cell(first), board.get_solution_cell(first))
+            self.assertEqual(board.get_cell(first), board.get_solution_cell(second))
+            board.swap(first, second)
+            hint = board.hint()
+        self.assertTrue(board.check_solved())
+        self.assertIsNone(board.hint())
+
+    def test_shuffle_keeps_colors(self):
+        solution = Board(6).solution
+        # Repeated colors used to break the value-based shuffle
+        solution[1][1] = solution[2][2] = solution[0][1]
+        board = Board(6, solution=solution)
+        self.assertEqual(board.solution, solution)
+        for _ in range(50):
+            shuffled = board.shuffle_board_from_solution()
+            self.assertEqual(sorted(shuffled), sorted(board.solution_cells))
+            self.assertNotEqual(shuffled, board.solution_cells)
+            for position in [0, 5, 30, 35]:
+                self.assertEqual(shuffled[position], board.solution_cells[position])
+
+    def test_optimal_solver(self):
+        board = Board(20)
+        optimal = board.min_swaps()
+        swaps = board.solve()
+        self.assertEqual(len(swaps), optimal)
+        for first, second in swaps:
+            board.swap(first, second)
+        self.assertTrue(board.check_solved())
+        # A single transposition of two distinct colors takes one swap; a 3-cycle takes two
+        self.assertEqual(min_swaps([1, 0, 2], [0, 1, 2]), 1)
+        self.assertEqual(min_swaps([1, 2, 0], [0, 1, 2]), 2)
+        self.assertEqual(optimal_swaps([0, 1, 2], [0, 1, 2]), [])
+        [grade] = grade_games([([1, 2, 0], [0, 1, 2], 4)])
+        self.assertEqual((grade.optimal, grade.extra_moves, grade.efficiency), (2, 2, 0.5))
+
+    def test_win_reports_optimal(self):
+        for first, second in self.logic.color_board.solve():
+            self.logic.select_and_swap(first)
+            self.logic.select_and_swap(second)
+        self.assertTrue(self.logic.completed)
+        self.logic.ui.show_win.assert_called_once_with(
+            self.logic.optimal_moves,
+            self.logic.optimal_moves,
+            exact=not self.logic.color_board.repeated_colors,
+        )
+        repeated = Board(3, solution=[["#000000"] * 3, ["#ffffff"] * 3, ["#000000"] * 3])
+        self.assertFalse(main.ColorLogic(3, HeadlessUI(), board=repeated).optimal_is_exact)
+
+    def test_grid_hit_testing(self):
+        # Every pixel hit-tests to the cell that is painted over it
+        for length, cells in [(1000, 30), (500, 7), (99, 99), (640, 25)]:
+            for pixel in range(length):
+                index = main.cell_index(pixel, length, cells)
+                start = main.cell_edge(index, length, cells)
+                end = main.cell_edge(index + 1, length, cells)
+                self.assertTrue(start <= pixel < end, (length, cells, pixel))
+
+    def test_headless_simulation(self):
+        for player in PLAYERS:
+            with self.subTest(params=player):
+                report = simulate(player, 4, 5, max_moves=500)
+                self.assertEqual(report.games, 5)
+                self.assertEqual(len(report.move_latency_us), report.moves)
+        report = simulate("optimal", 6, 5)
+        self.assertEqual(report.completed, 5)
+        logic = main.ColorLogic(6, HeadlessUI())
+        play_game(logic, optimal_player, [], 1000)
+        self.assertEqual(logic.ui.last_score, (logic.optimal_moves, logic.optimal_moves))
+
+    def test_batch_shards(self):
+        with tempfile.TemporaryDirectory() as directory:
+            results = batch.run([4], 5, directory, shard_size=2, workers=1, file_format="npy")
+            self.assertEqual(sorted(shard.boards for shard in results[4]), [1, 2, 2])
+            boards = np.load(batch.shard_path(directory, 4, 0, "npy"))
+            self.assertEqual((boards.shape, boards.dtype), ((2, 4, 4, 3), np.uint8))
+            batch.generate_shard(3, 0, 2, directory, "hex")
+            with open(batch.shard_path(directory, 3, 0, "hex")) as file:
+                tables = file.read().strip().split("\n\n")
+            self.assertEqual([len(table.split("\n")) for table in tables], [3, 3])
+        # One shard on a pool of 4 runs at the speed of one worker, not four
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            batch.report({5: [batch.ShardResult(5, 100, 0, 2.0, 0)]}, 2.0, workers=4)
+        self.assertIn("50 boards/s", output.getvalue().splitlines()[0])
+
+    def test_seeded_boards(self):
+        first, second = Board(7, seed=1234), Board(7, seed=1234)
+        self.assertEqual(first.solution, second.solution)
+        self.assertEqual(first.board, second.board)
+        self.assertNotEqual(Board(7, seed=4321).solution, first.solution)
+        boards = ColorGenerator(5, seed=99).generate_boards(5, 20)
+        self.assertTrue((boards == ColorGenerator(5, seed=99).generate_boards(5, 20)).all())
+        self.assertEqual(batch.shard_seed(7, 5, 0), batch.shard_seed(7, 5, 0))
+        self.assertNotEqual(batch.shard_seed(7, 5, 0), batch.shard_seed(7, 5, 1))
+
+    def test_palette_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "palettes.sqlite")
+            cache = PaletteCache(path, max_bytes=4 * 27)
+            generated = Board(3, seed=5, cache=cache)
+            stored = cache.get(3, DEFAULT_STRATEGY, 5)
+            self.assertIsNotNone(stored)
+            # Read back from the cache, the game is the same as the generated one
+            cached = Board(3, seed=5, cache=cache)
+            self.assertEqual((cached.solution, cached.board), (generated.solution, generated.board))
+            # Only the 4 most recently used 3x3 palettes fit, so seed 5 is evicted
+            rgb = np.zeros((3, 3, 3), np.uint8)
+            cache.put_many(3, DEFAULT_STRATEGY, [(seed, rgb) for seed in range(10, 14)])
+            self.assertEqual(len(cache), 4)
+            found = cache.get_many(3, DEFAULT_STRATEGY, range(20))
+            self.assertEqual(sorted(found), [10, 11, 12, 13])
+            # The running byte total follows inserts and evictions
+            total = cache.connection.execute("SELECT total FROM palette_bytes").fetchone()[0]
+            self.assertEqual(total, 4 * 27)
+            # New games take unplayed palettes first, then fall back to generating
+            self.assertEqual(Board(3, cache=cache).seed, 10)
+            cache.close()
+            path = os.path.join(directory, "filled.sqlite")
+            results = batch.run([3], 3, directory, 3, 1, "npy", seed=1, cache_path=path)
+            self.assertEqual(results[3][0].boards, 3)
+            # The per-board generators' statistics reach the shard report
+            stats = BatchStats()
+            seeds, _ = batch.generate_seeded_boards(20, 5, 1, stats=stats)
+            expected = BatchStats()
+            for seed in seeds:
+                generator = ColorGenerator(20, seed)
+                generator.generate_board_array(20)
+                expected.boards += 1
+                expected.redrawn += generator.board_stats.redrawn
+                expected.indistinct += generator.board_stats.indistinct
+            self.assertEqual(stats, expected)
+            cache = PaletteCache(path)
+            self.assertEqual(len(cache), 3)
+            taken = cache.take_unplayed(3, DEFAULT_STRATEGY)
+            self.assertIsNotNone(taken)
+            seed, rgb = taken
+            # Batch entries carry their own seed, which regenerates the same palette
+            regenerated = hsl_array_to_rgb(ColorGenerator(3, seed).generate_board_array(3))
+            self.assertTrue((regenerated == rgb).all())
+            cache.close()
+
+    def test_save_and_resume(self):
+        solution = Board(4).solution
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "game.colors")
+            # A seeded board and one built from an explicit palette
+            for board in (Board(6, seed=8), Board(4, solution=solution)):
+                logic = main.ColorLogic(board.size, HeadlessUI(), board=board)
+                logic.journal = GameJournal(path)
+                logic.journal.save(logic)
+                checkpoint = os.path.getsize(path)
+                for _ in range(3):
+                    logic.select_and_swap(Coordinates(1, 1))
+                    logic.select_and_swap(Coordinates(2, 1))
+                # Autosave only appends one small record per swap
+                self.assertEqual(os.path.getsize(path), checkpoint + 3 * 4)
+                logic.journal.close()
+                resumed = load_game(path, HeadlessUI())
+                self.assertEqual(resumed.color_board.board, logic.color_board.board)
+                self.assertEqual(resumed.solution, logic.solution)
+                self.assertEqual(resumed.total_moves, 3)
+                self.assertEqual(resumed.optimal_moves, logic.optimal_moves)
+                self.assertEqual(resumed.color_board.misplaced, logic.color_board.misplaced)
+                # Corrupt saves are rejected with ValueError instead of crashing the startup
+                with open(path, "rb") as file:
+                    data = bytearray(file.read())
+                corrupt_size = data[:6] + struct.pack("<H", 2) + data[8:]
+                corrupt_move = data + struct.pack("<HH", 0, board.size ** 2)
+                colors_offset = savegame.HEADER.size
+                if not board.from_seed:
+                    colors_offset += 3 * len(board.palette) + 2 * board.size ** 2
+                corrupt_color = bytearray(data)
+                corrupt_color[colors_offset:colors_offset + 2] = struct.pack("<H", 999)
+                # An existing color in the wrong place, so the board can never be solved
+                unsolvable = bytearray(data)
+                color = (board.board_cells[0] + 1) % len(board.palette)
+                unsolvable[colors_offset:colors_offset + 2] = struct.pack("<H", color)
+                corrupt_saves = (corrupt_size, corrupt_move, corrupt_color, unsolvable, data[:-20])
+                for corrupt in corrupt_saves:
+                    with open(path, "wb") as file:
+                        file.write(corrupt)
+                    with self.assertRaises(ValueError):
+                        load_game(path, HeadlessUI())
+
+    def test_distinctness(self):
+        white, red = colors.rgb_array_to_oklab(np.array([[255, 255, 255], [255, 0, 0]], np.uint8))
+        np.testing.assert_allclose(white, [1, 0, 0], atol=1e-4)
+        np.testing.assert_allclose(red, [0.62796, 0.22486, 0.12585], atol=1e-4)
+        boards = np.zeros((2, 3, 3, 3), np.uint8)
+        boards[0, :, :, 0] = np.arange(9).reshape(3, 3) * 20
+        boards[1] = boards[0]
+        boards[1, 2, 2] = boards[1, 0, 0]
+        duplicates, delta_e = distinctness.score_boards(boards)
+        self.assertEqual(duplicates.tolist(), [0, 1])
+        self.assertTrue((delta_e > 0).all())
+        # Generated boards are redrawn until they pass, or the most distinct attempt is kept
+        generator = ColorGenerator(6, seed=3)
+        boards = generator.generate_boards(6, 200)
+        duplicates, delta_e = distinctness.score_boards(boards)
+        threshold = distinctness.neighbour_threshold(6)
+        failing = ~distinctness.is_distinct(duplicates, delta_e, threshold)
+        self.assertEqual(int(failing.sum()), generator.last_batch_stats.indistinct)
+        self.assertLess(generator.last_batch_stats.indistinct, 10)
+        rgb = hsl_array_to_rgb(ColorGenerator(12, seed=3).generate_board_array(12))
+        self.assertEqual(distinctness.duplicate_counts(rgb), 0)
+        self.assertTrue((ColorGenerator(12, seed=3).generate_board_rgb(12) == rgb).all())
+        # Larger boards settle for a smaller neighbour distance, and the largest aren't redrawn
+        # but still count as indistinct
+        self.assertEqual(distinctness.neighbour_threshold(4), distinctness.MIN_NEIGHBOUR_DELTA_E)
+        self.assertLess(distinctness.neighbour_threshold(20), distinctness.neighbour_threshold(10))
+        generator = ColorGenerator(60, seed=3)
+        generator.generate_board_rgb(60)
+        self.assertEqual(generator.board_stats, BatchStats(boards=1, indistinct=1))
+        generator.generate_boards(60, 3)
+        self.assertEqual(generator.last_batch_stats.redrawn, 0)
+        self.assertEqual(generator.last_batch_stats.indistinct, 3)
+
+    def test_corner_strategies(self):
+        self.assertEqual(
+            set(CORNER_STRATEGIES),
+            {"smaller_range", "across_colors", "starting_points", "full_color_image"},
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "game.colors")
+            for strategy in CORNER_STRATEGIES:
+                with self.subTest(strategy=strategy):
+                    board = Board(5, seed=21, strategy=strategy)
+                    self.assertEqual(board.strategy, strategy)
+                    self.assertEqual(Board(5, seed=21, strategy=strategy).solution, board.solution)
+                    # Seeded saves regenerate the palette with the same strategy
+                    logic = main.ColorLogic(5, HeadlessUI(), board=board)
+                    GameJournal(path).save(logic)
+                    self.assertEqual(load_game(path, HeadlessUI()).solution, board.solution)
+                    boards = ColorGenerator(5, seed=2, strategy=strategy).generate_boards(5, 3)
+                    self.assertEqual(boards.shape, (3, 5, 5, 3))
+        with self.assertRaises(AssertionError):
+            ColorGenerator(5, strategy="nope")
+        # Strategies that ignore the seed aren't offered for new games
+        self.assertNotIn("full_color_image", playable_strategies())
+        self.assertIn(DEFAULT_STRATEGY, playable_strategies())